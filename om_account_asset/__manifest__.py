@@ -17,6 +17,9 @@
         'security/ir.model.access.csv',
         'wizard/asset_depreciation_confirmation_wizard_views.xml',
         'wizard/asset_modify_views.xml',
+        'wizard/asset_depreciation_simulation_views.xml',
+        'wizard/asset_roll_forward_views.xml',
+        'wizard/asset_disposal_views.xml',
         'views/account_asset_views.xml',
         'views/account_move_views.xml',
         'views/account_asset_templates.xml',
@@ -1,12 +1,20 @@
 import calendar
+import logging
+import threading
+from collections import defaultdict
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
 from odoo.tools import float_compare, float_is_zero
+from odoo.tools.misc import format_amount, format_date
 from markupsafe import Markup
 
+from .depreciation_schedule import compute_schedules
+
+_logger = logging.getLogger(__name__)
+
 
 class AccountAssetCategory(models.Model):
     _name = 'account.asset.category'
@@ -125,7 +133,7 @@ class AccountAssetAsset(models.Model):
     _description = 'Asset/Revenue Recognition'
     _inherit = ['mail.thread', 'mail.activity.mixin', 'analytic.mixin']
 
-    entry_count = fields.Integer(compute='_entry_count', string='# Asset Entries')
+    entry_count = fields.Integer(compute='_entry_count', string='# Asset Entries', store=True)
     name = fields.Char(string='Asset Name', required=True)
     code = fields.Char(string='Reference', size=32)
     value = fields.Monetary(string='Gross Value', required=True)
@@ -168,7 +176,7 @@ class AccountAssetAsset(models.Model):
     method_progress_factor = fields.Float(
         string='Degressive Factor', default=0.3
     )
-    value_residual = fields.Monetary(compute='_amount_residual', string='Residual Value')
+    value_residual = fields.Monetary(compute='_amount_residual', string='Residual Value', store=True)
     method_time = fields.Selection(
         [('number', 'Number of Entries'), ('end', 'Ending Date')],
         string='Time Method', required=True, default='number',
@@ -219,10 +227,17 @@ class AccountAssetAsset(models.Model):
 
     @api.model
     def _cron_generate_entries(self):
-        self.compute_generated_entries(datetime.today())
+        # never commit during the tests
+        self.compute_generated_entries(
+            datetime.today(), auto_commit=not getattr(threading.current_thread(), 'testing', False))
+
+    @api.model
+    def _get_depreciation_batch_size(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'om_account_asset.depreciation_batch_size', 500))
 
     @api.model
-    def compute_generated_entries(self, date, asset_type=None):
+    def compute_generated_entries(self, date, asset_type=None, auto_commit=False):
         # Entries generated : one by grouped category and one by asset from ungrouped category
         created_move_ids = []
         type_domain = []
@@ -230,11 +245,11 @@ class AccountAssetAsset(models.Model):
             type_domain = [('type', '=', asset_type)]
 
         ungrouped_assets = self.env['account.asset.asset'].search(type_domain + [('state', '=', 'open'), ('category_id.group_entries', '=', False)])
-        created_move_ids += ungrouped_assets._compute_entries(date, group_entries=False)
+        created_move_ids += ungrouped_assets._compute_entries(date, group_entries=False, auto_commit=auto_commit)
 
         for grouped_category in self.env['account.asset.category'].search(type_domain + [('group_entries', '=', True)]):
             assets = self.env['account.asset.asset'].search([('state', '=', 'open'), ('category_id', '=', grouped_category.id)])
-            created_move_ids += assets._compute_entries(date, group_entries=True)
+            created_move_ids += assets._compute_entries(date, group_entries=True, auto_commit=auto_commit)
         return created_move_ids
 
     def _compute_board_amount(self, sequence, residual_amount, amount_to_depr,
@@ -284,14 +299,23 @@ class AccountAssetAsset(models.Model):
             undone_dotation_number += 1
         return undone_dotation_number
 
-    def compute_depreciation_board(self):
-        self.ensure_one()
+    def _get_depreciation_board_fields(self):
+        """ Fields whose modification requires the depreciation board to be recomputed. """
+        return [
+            'value', 'salvage_value', 'date', 'code', 'currency_id', 'company_id',
+            'method', 'method_number', 'method_period', 'method_end', 'method_progress_factor',
+            'method_time', 'prorata', 'date_first_depreciation', 'first_depreciation_manual_date',
+        ]
 
-        posted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: x.move_check).sorted(key=lambda l: l.depreciation_date)
-        unposted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: not x.move_check)
+    def _compute_board_values(self):
+        """ Compute the target schedule of the unposted depreciation lines of the asset,
+        without writing anything.
 
-        # Remove old unposted depreciation lines. We cannot use unlink() with One2many field
-        commands = [(2, line_id.id, False) for line_id in unposted_depreciation_line_ids]
+        :return: list of values of the depreciation lines to come, in sequence order
+        """
+        self.ensure_one()
+        posted_depreciation_line_ids = self.depreciation_line_ids.filtered(lambda x: x.move_check).sorted(key=lambda l: l.depreciation_date)
+        board_values = []
 
         if self.value_residual != 0.0:
             amount_to_depr = residual_amount = self.value_residual
@@ -328,7 +352,7 @@ class AccountAssetAsset(models.Model):
                 if float_is_zero(amount, precision_rounding=self.currency_id.rounding):
                     continue
                 residual_amount -= amount
-                vals = {
+                board_values.append({
                     'amount': amount,
                     'asset_id': self.id,
                     'sequence': sequence,
@@ -336,8 +360,7 @@ class AccountAssetAsset(models.Model):
                     'remaining_value': residual_amount,
                     'depreciated_value': self.value - (self.salvage_value + residual_amount),
                     'depreciation_date': depreciation_date,
-                }
-                commands.append((0, False, vals))
+                })
 
                 depreciation_date = depreciation_date + relativedelta(months=+self.method_period)
 
@@ -350,10 +373,114 @@ class AccountAssetAsset(models.Model):
                     max_day_in_month = calendar.monthrange(depreciation_date.year, depreciation_date.month)[1]
                     depreciation_date = depreciation_date.replace(day=max_day_in_month)
 
-        self.write({'depreciation_line_ids': commands})
+        return board_values
+
+    def _get_board_line_changes(self, line, vals):
+        """ Return the subset of ``vals`` that differs from the existing depreciation ``line``. """
+        changes = {}
+        for field_name in ('amount', 'remaining_value', 'depreciated_value'):
+            if self.currency_id.compare_amounts(line[field_name], vals[field_name]) != 0:
+                changes[field_name] = vals[field_name]
+        for field_name in ('sequence', 'name', 'depreciation_date'):
+            if line[field_name] != vals[field_name]:
+                changes[field_name] = vals[field_name]
+        return changes
+
+    def compute_depreciation_board(self):
+        """ Bring the unposted depreciation lines in line with the target schedule.
+
+        Existing unposted lines are matched on their sequence: lines whose values
+        changed are updated, with one write per set of identical changes, missing
+        lines are created and superfluous lines are removed, all in bulk for the
+        whole recordset.
+        """
+        lines_to_create = []
+        lines_to_unlink = self.env['account.asset.depreciation.line']
+        # lines getting the same changes, e.g. a new date, are updated together
+        lines_to_update = defaultdict(lambda: self.env['account.asset.depreciation.line'])
+
+        for asset in self:
+            unposted_depreciation_line_ids = asset.depreciation_line_ids.filtered(lambda x: not x.move_check)
+            existing_lines = {}
+            for line in unposted_depreciation_line_ids.sorted(key=lambda l: (l.sequence, l.id)):
+                if line.sequence in existing_lines:
+                    lines_to_unlink |= line
+                else:
+                    existing_lines[line.sequence] = line
+
+            for vals in asset._compute_board_values():
+                line = existing_lines.pop(vals['sequence'], None)
+                if not line:
+                    lines_to_create.append(vals)
+                    continue
+                changes = asset._get_board_line_changes(line, vals)
+                if changes:
+                    lines_to_update[tuple(sorted(changes.items()))] |= line
+
+            for line in existing_lines.values():
+                lines_to_unlink |= line
+
+        if lines_to_unlink:
+            lines_to_unlink.unlink()
+        for changes, lines in lines_to_update.items():
+            lines.write(dict(changes))
+        if lines_to_create:
+            self.env['account.asset.depreciation.line'].create(lines_to_create)
 
         return True
 
+    def _get_schedule_params(self, overrides=None):
+        """ Describe the assets for the depreciation schedule engine, in bulk.
+
+        :param overrides: optional dictionary of asset fields replacing the stored values,
+                          to simulate another depreciation method
+        :return: list of dictionaries, one per asset
+        """
+        overrides = overrides or {}
+        posted_data = {
+            asset.id: (count, last_date)
+            for asset, count, last_date in self.env['account.asset.depreciation.line']._read_group(
+                [('asset_id', 'in', self.ids), ('move_check', '=', True)],
+                ['asset_id'], ['__count', 'depreciation_date:max'],
+            )
+        }
+        fiscalyear_dates = {}
+        params_list = []
+        for asset in self:
+            params = {
+                'id': asset.id,
+                'value_residual': asset.value_residual,
+                'date': asset.date,
+                'method': asset.method,
+                'method_number': asset.method_number,
+                'method_period': asset.method_period,
+                'method_end': asset.method_end,
+                'method_progress_factor': asset.method_progress_factor,
+                'method_time': asset.method_time,
+                'prorata': asset.prorata,
+                'date_first_depreciation': asset.date_first_depreciation,
+                'first_depreciation_manual_date': asset.first_depreciation_manual_date,
+                'fiscalyear_last_month': asset.company_id.fiscalyear_last_month,
+                'fiscalyear_last_day': asset.company_id.fiscalyear_last_day,
+                'rounding': asset.currency_id.rounding,
+            }
+            params.update(overrides)
+            params['posted_count'], params['last_posted_date'] = posted_data.get(asset.id, (0, False))
+            if params['prorata'] and params['method_period'] % 12 == 0:
+                key = (asset.company_id, asset.date)
+                if key not in fiscalyear_dates:
+                    fiscalyear_dates[key] = asset.company_id.compute_fiscalyear_dates(asset.date)['date_to']
+                params['fiscalyear_date_to'] = fiscalyear_dates[key]
+            params_list.append(params)
+        return params_list
+
+    def _simulate_depreciation_schedules(self, overrides=None, date_to=None):
+        """ Compute the depreciation lines to come of the assets without writing anything.
+
+        :return: dictionary ``{asset_id: [(sequence, depreciation_date, amount), ...]}``
+        """
+        return compute_schedules(self._get_schedule_params(overrides), date_to=date_to)
+
     def validate(self):
         self.write({'state': 'open'})
         fields = [
@@ -367,6 +494,9 @@ class AccountAssetAsset(models.Model):
             'invoice_id',
         ]
         ref_tracked_fields = self.env['account.asset.asset'].fields_get(fields)
+        author_id, email_from = self._message_compute_author()
+        subtype_id = self.env['ir.model.data']._xmlid_to_res_id('mail.mt_note')
+        message_values_list = []
         for asset in self:
             tracked_fields = ref_tracked_fields.copy()
             if asset.method == 'linear':
@@ -376,59 +506,119 @@ class AccountAssetAsset(models.Model):
             else:
                 del(tracked_fields['method_number'])
             dummy, tracking_value_ids = asset._mail_track(tracked_fields, dict.fromkeys(fields))
-            asset.message_post(subject=_('Asset created'), tracking_value_ids=tracking_value_ids)
+            message_values_list.append({
+                'model': asset._name,
+                'res_id': asset.id,
+                'subject': _('Asset created'),
+                'body': '',
+                'author_id': author_id,
+                'email_from': email_from,
+                'message_type': 'notification',
+                'subtype_id': subtype_id,
+                'is_internal': True,
+                'tracking_value_ids': tracking_value_ids,
+            })
+        # log the creation of all the assets in one batch
+        self.sudo()._message_create(message_values_list)
 
     def _return_disposal_view(self, move_ids):
-        name = _('Disposal Move')
-        view_mode = 'form'
-        if len(move_ids) > 1:
-            name = _('Disposal Moves')
-            view_mode = 'tree,form'
-        return {
-            'name': name,
+        action = {
+            'name': _('Disposal Move'),
             'view_type': 'form',
-            'view_mode': view_mode,
+            'view_mode': 'form',
             'res_model': 'account.move',
             'type': 'ir.actions.act_window',
             'target': 'current',
             'res_id': move_ids[0],
         }
-
-    def _get_disposal_moves(self):
-        move_ids = []
+        if len(move_ids) > 1:
+            action.update({
+                'name': _('Disposal Moves'),
+                'view_mode': 'list,form',
+                'domain': [('id', 'in', move_ids)],
+            })
+            del action['res_id']
+        return action
+
+    def _get_disposal_moves(self, disposal_date=None, group_by_category=False):
+        """ Replace the unposted depreciation lines of the assets by a single line of their
+        residual value and create the matching entries, in bulk for the whole recordset.
+
+        :param disposal_date: date of the disposal, today by default
+        :param group_by_category: create one entry per asset category instead of one per asset
+        :return: ids of the created (draft) moves
+        """
+        disposal_date = disposal_date or fields.Date.context_today(self)
+        DepreciationLine = self.env['account.asset.depreciation.line']
+        lines_to_unlink = DepreciationLine
+        vals_list = []
         for asset in self:
             unposted_depreciation_line_ids = asset.depreciation_line_ids.filtered(lambda x: not x.move_check)
-            if unposted_depreciation_line_ids:
-                old_values = {
-                    'method_end': asset.method_end,
-                    'method_number': asset.method_number,
-                }
-
-                # Remove all unposted depr. lines
-                commands = [(2, line_id.id, False) for line_id in unposted_depreciation_line_ids]
-
-                # Create a new depr. line with the residual amount and post it
-                sequence = len(asset.depreciation_line_ids) - len(unposted_depreciation_line_ids) + 1
-                today = fields.Datetime.today()
-                vals = {
-                    'amount': asset.value_residual,
-                    'asset_id': asset.id,
-                    'sequence': sequence,
-                    'name': (asset.code or '') + '/' + str(sequence),
-                    'remaining_value': 0,
-                    'depreciated_value': asset.value - asset.salvage_value,  # the asset is completely depreciated
-                    'depreciation_date': today,
-                }
-                commands.append((0, False, vals))
-                asset.write({'depreciation_line_ids': commands, 'method_end': today, 'method_number': sequence})
-                tracked_fields = self.env['account.asset.asset'].fields_get(['method_number', 'method_end'])
-                changes, tracking_value_ids = asset._mail_track(tracked_fields, old_values)
-                if changes:
-                    asset.message_post(subject=_('Asset sold or disposed. Accounting entry awaiting for validation.'), tracking_value_ids=tracking_value_ids)
-                move_ids += asset.depreciation_line_ids[-1].create_move(post_move=False)
+            if not unposted_depreciation_line_ids:
+                continue
+            lines_to_unlink |= unposted_depreciation_line_ids
+
+            # Create a new depr. line with the residual amount
+            sequence = len(asset.depreciation_line_ids) - len(unposted_depreciation_line_ids) + 1
+            vals_list.append({
+                'amount': asset.value_residual,
+                'asset_id': asset.id,
+                'sequence': sequence,
+                'name': (asset.code or '') + '/' + str(sequence),
+                'remaining_value': 0,
+                'depreciated_value': asset.value - asset.salvage_value,  # the asset is completely depreciated
+                'depreciation_date': disposal_date,
+            })
+        if not vals_list:
+            return []
 
+        # Remove all unposted depr. lines
+        lines_to_unlink.unlink()
+        disposal_lines = DepreciationLine.create(vals_list)
+
+        assets_by_sequence = defaultdict(list)
+        for vals in vals_list:
+            assets_by_sequence[vals['sequence']].append(vals['asset_id'])
+        for sequence, asset_ids in assets_by_sequence.items():
+            self.browse(asset_ids).with_context(asset_skip_depreciation_board=True).write({
+                'method_end': disposal_date,
+                'method_number': sequence,
+            })
+
+        if group_by_category:
+            move_ids = disposal_lines.with_context(depreciation_date=disposal_date)._create_grouped_moves(post_move=False)
+        else:
+            move_ids = disposal_lines.create_move(post_move=False)
+        self._log_disposal(move_ids, disposal_date)
         return move_ids
 
+    def _log_disposal(self, move_ids, disposal_date):
+        """ Log the disposal in batch on the disposed assets, and one summary of the
+        disposed assets and their residual value on the journal of the entries. """
+        moves = self.env['account.move'].browse(move_ids)
+        asset_bodies = {}
+        lines_by_journal = defaultdict(lambda: self.env['account.asset.depreciation.line'])
+        for move in moves:
+            for line in move.asset_depreciation_ids:
+                asset_bodies[line.asset_id.id] = _(
+                    'Asset sold or disposed on %(date)s for a residual value of %(amount)s. '
+                    'Accounting entry awaiting for validation.',
+                    date=format_date(self.env, disposal_date),
+                    amount=format_amount(self.env, line.amount, line.asset_id.currency_id))
+                lines_by_journal[move.journal_id] |= line
+        if asset_bodies:
+            self.browse(list(asset_bodies))._message_log_batch(bodies=asset_bodies)
+        for journal, lines in lines_by_journal.items():
+            items = Markup().join(
+                Markup('<li>%s: %s</li>') % (
+                    line.asset_id.display_name,
+                    format_amount(self.env, line.amount, line.asset_id.currency_id))
+                for line in lines
+            )
+            journal._message_log(body=Markup('%s<ul>%s</ul>') % (_(
+                '%(count)s assets sold or disposed on %(date)s. Accounting entries awaiting for validation:',
+                count=len(lines), date=format_date(self.env, disposal_date)), items))
+
     def set_to_close(self):
         move_ids = self._get_disposal_moves()
         if move_ids:
@@ -441,11 +631,23 @@ class AccountAssetAsset(models.Model):
 
     @api.depends('value', 'salvage_value', 'depreciation_line_ids.move_check', 'depreciation_line_ids.amount')
     def _amount_residual(self):
+        # posted amounts of saved assets are summed in one query, records being
+        # edited in a form are computed from their lines in memory
+        saved_assets = self.filtered(lambda asset: isinstance(asset.id, int))
+        posted_amounts = {}
+        if saved_assets:
+            posted_amounts = {
+                asset.id: amount
+                for asset, amount in self.env['account.asset.depreciation.line']._read_group(
+                    [('asset_id', 'in', saved_assets.ids), ('move_check', '=', True)],
+                    ['asset_id'], ['amount:sum'],
+                )
+            }
         for rec in self:
-            total_amount = 0.0
-            for line in rec.depreciation_line_ids:
-                if line.move_check:
-                    total_amount += line.amount
+            if isinstance(rec.id, int):
+                total_amount = posted_amounts.get(rec.id, 0.0)
+            else:
+                total_amount = sum(line.amount for line in rec.depreciation_line_ids if line.move_check)
             rec.value_residual = rec.value - total_amount - rec.salvage_value
 
     @api.onchange('company_id')
@@ -460,9 +662,21 @@ class AccountAssetAsset(models.Model):
 
     @api.depends('depreciation_line_ids.move_id')
     def _entry_count(self):
+        saved_assets = self.filtered(lambda asset: isinstance(asset.id, int))
+        entry_counts = {}
+        if saved_assets:
+            entry_counts = {
+                asset.id: count
+                for asset, count in self.env['account.asset.depreciation.line']._read_group(
+                    [('asset_id', 'in', saved_assets.ids), ('move_id', '!=', False)],
+                    ['asset_id'], ['__count'],
+                )
+            }
         for asset in self:
-            res = self.env['account.asset.depreciation.line'].search_count([('asset_id', '=', asset.id), ('move_id', '!=', False)])
-            asset.entry_count = res or 0
+            if isinstance(asset.id, int):
+                asset.entry_count = entry_counts.get(asset.id, 0)
+            else:
+                asset.entry_count = len(asset.depreciation_line_ids.filtered('move_id'))
 
     @api.constrains('prorata', 'method_time')
     def _check_prorata(self):
@@ -506,28 +720,45 @@ class AccountAssetAsset(models.Model):
         default['name'] = self.name + _(' (copy)')
         return super(AccountAssetAsset, self).copy_data(default)
 
-    def _compute_entries(self, date, group_entries=False):
+    def _compute_entries(self, date, group_entries=False, auto_commit=False):
         depreciation_ids = self.env['account.asset.depreciation.line'].search([
             ('asset_id', 'in', self.ids), ('depreciation_date', '<=', date),
-            ('move_check', '=', False)])
+            ('move_check', '=', False)], order='asset_id, depreciation_date, id')
         if group_entries:
-            return depreciation_ids.create_grouped_move()
-        return depreciation_ids.create_move()
+            if not auto_commit:
+                return depreciation_ids.create_grouped_move()
+            # the single entry of the category is committed on its own, or rolled back
+            # and logged without aborting the other categories
+            try:
+                with self.env.cr.savepoint():
+                    move_ids = depreciation_ids.create_grouped_move()
+            except Exception:
+                _logger.exception("Failed to generate the grouped depreciation entry of lines %s", depreciation_ids.ids)
+                return []
+            self.env.cr.commit()
+            return move_ids
+        return depreciation_ids._create_move_batches(auto_commit=auto_commit)
 
     @api.model_create_multi
     def create(self, vals_list):
         assets = super(AccountAssetAsset, self.with_context(mail_create_nolog=True)).create(vals_list)
-        for asset in assets:
-            asset.sudo().compute_depreciation_board()
+        assets.sudo().compute_depreciation_board()
         return assets
 
     def write(self, vals):
         res = super(AccountAssetAsset, self).write(vals)
-        if 'depreciation_line_ids' not in vals and 'state' not in vals:
-            for rec in self:
-                rec.compute_depreciation_board()
+        if 'depreciation_line_ids' not in vals and 'state' not in vals \
+                and not self.env.context.get('asset_skip_depreciation_board') \
+                and any(field_name in vals for field_name in self._get_depreciation_board_fields()):
+            self.compute_depreciation_board()
+        if any(field_name in vals for field_name in self._get_asset_report_fields()):
+            self.env['asset.asset.report']._schedule_refresh(self.ids)
         return res
 
+    def _get_asset_report_fields(self):
+        """ Fields of the asset copied in the Assets Analysis. """
+        return ['active', 'state', 'value', 'date', 'category_id', 'partner_id', 'company_id']
+
     def open_entries(self):
         move_ids = []
         for asset in self:
@@ -582,19 +813,56 @@ class AccountAssetDepreciationLine(models.Model):
             line.move_posted_check = True if line.move_id and line.move_id.state == 'posted' else False
 
     def create_move(self, post_move=True):
-        created_moves = self.env['account.move']
+        if any(line.move_id for line in self):
+            raise UserError(_('This depreciation is already linked to a journal entry. Please post or delete it.'))
+
+        move_vals_list = []
         for line in self:
-            if line.move_id:
-                raise UserError(_('This depreciation is already linked to a journal entry. Please post or delete it.'))
             move_vals = self._prepare_move(line)
-            move = self.env['account.move'].create(move_vals)
-            line.write({'move_id': move.id, 'move_check': True})
-            created_moves |= move
+            move_vals['asset_depreciation_ids'] = [(4, line.id)]
+            move_vals_list.append(move_vals)
+        created_moves = self.env['account.move'].create(move_vals_list)
 
         if post_move and created_moves:
             created_moves.filtered(lambda m: any(m.asset_depreciation_ids.mapped('asset_id.category_id.open_asset'))).action_post()
         return [x.id for x in created_moves]
 
+    def _create_move_batches(self, batch_size=None, auto_commit=False):
+        """ Create and post the moves of the depreciation lines by chunks of ``batch_size``.
+
+        With ``auto_commit``, every chunk is committed on its own. A failing chunk is
+        rolled back and its lines are retried one by one, so that a failing line is
+        logged and skipped without holding back the others; it stays without move, so
+        that the next run picks it up again.
+        """
+        batch_size = batch_size or self.env['account.asset.asset']._get_depreciation_batch_size()
+        created_move_ids = []
+        for index in range(0, len(self), batch_size):
+            batch = self[index:index + batch_size]
+            if not auto_commit:
+                created_move_ids += batch.create_move()
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    batch_move_ids = batch.create_move()
+            except Exception:
+                _logger.warning("Failed to generate the depreciation entries of lines %s, retrying them one by one",
+                                batch.ids, exc_info=True)
+                batch_move_ids = batch._create_moves_one_by_one()
+            self.env.cr.commit()
+            created_move_ids += batch_move_ids
+        return created_move_ids
+
+    def _create_moves_one_by_one(self):
+        created_move_ids = []
+        for line in self:
+            try:
+                with self.env.cr.savepoint():
+                    created_move_ids += line.create_move()
+            except Exception:
+                _logger.exception("Failed to generate the depreciation entry of line %s", line.id)
+        return created_move_ids
+
     def _prepare_move(self, line):
         category_id = line.asset_id.category_id
         analytic_distribution = line.asset_id.analytic_distribution
@@ -634,43 +902,47 @@ class AccountAssetDepreciationLine(models.Model):
         return move_vals
 
     def _prepare_move_grouped(self):
-        asset_id = self[0].asset_id
-        category_id = asset_id.category_id  # we can suppose that all lines have the same category
-        account_analytic_id = asset_id.account_analytic_id
-        # analytic_tag_ids = asset_id.analytic_tag_ids
-        analytic_distribution = asset_id.analytic_distribution
-
+        """ Values of a single move for the lines of one asset category, the amounts being
+        converted at the date of the move and summed per analytic distribution. """
+        category_id = self[0].asset_id.category_id  # we can suppose that all lines have the same category
         depreciation_date = self.env.context.get('depreciation_date') or fields.Date.context_today(self)
-        amount = 0.0
+        amounts = defaultdict(float)
+        distributions = {}
         for line in self:
-            # Sum amount of all depreciation lines
+            # Sum amount of all depreciation lines, per analytic distribution of their asset
             company_currency = line.asset_id.company_id.currency_id
             current_currency = line.asset_id.currency_id
             company = line.asset_id.company_id
-            amount += current_currency._convert(line.amount, company_currency, company, fields.Date.today())
+            analytic_distribution = line.asset_id.analytic_distribution or {}
+            key = tuple(sorted(analytic_distribution.items()))
+            distributions[key] = analytic_distribution or False
+            amounts[key] += current_currency._convert(line.amount, company_currency, company, depreciation_date)
 
         name = category_id.name + _(' (grouped)')
-        move_line_1 = {
-            'name': name,
-            'account_id': category_id.account_depreciation_id.id,
-            'debit': 0.0,
-            'credit': amount,
-            'journal_id': category_id.journal_id.id,
-            'analytic_distribution': analytic_distribution,
-        }
-        move_line_2 = {
-            'name': name,
-            'account_id': category_id.account_depreciation_expense_id.id,
-            'credit': 0.0,
-            'debit': amount,
-            'journal_id': category_id.journal_id.id,
-            'analytic_distribution': analytic_distribution,
-        }
+        line_ids = []
+        for key, amount in amounts.items():
+            move_line_1 = {
+                'name': name,
+                'account_id': category_id.account_depreciation_id.id,
+                'debit': 0.0,
+                'credit': amount,
+                'journal_id': category_id.journal_id.id,
+                'analytic_distribution': distributions[key],
+            }
+            move_line_2 = {
+                'name': name,
+                'account_id': category_id.account_depreciation_expense_id.id,
+                'credit': 0.0,
+                'debit': amount,
+                'journal_id': category_id.journal_id.id,
+                'analytic_distribution': distributions[key],
+            }
+            line_ids += [(0, 0, move_line_1), (0, 0, move_line_2)]
         move_vals = {
             'ref': category_id.name,
             'date': depreciation_date or False,
             'journal_id': category_id.journal_id.id,
-            'line_ids': [(0, 0, move_line_1), (0, 0, move_line_2)],
+            'line_ids': line_ids,
         }
 
         return move_vals
@@ -688,6 +960,22 @@ class AccountAssetDepreciationLine(models.Model):
             created_moves.action_post()
         return [x.id for x in created_moves]
 
+    def _create_grouped_moves(self, post_move=True):
+        """ Create one move per asset category for the lines, with a single create. """
+        lines_by_category = defaultdict(lambda: self.env['account.asset.depreciation.line'])
+        for line in self:
+            lines_by_category[line.asset_id.category_id] |= line
+        move_vals_list = []
+        for lines in lines_by_category.values():
+            move_vals = lines._prepare_move_grouped()
+            move_vals['asset_depreciation_ids'] = [(6, 0, lines.ids)]
+            move_vals_list.append(move_vals)
+        created_moves = self.env['account.move'].create(move_vals_list)
+
+        if post_move and created_moves:
+            created_moves.action_post()
+        return created_moves.ids
+
     def post_lines_and_close_asset(self):
         # we re-evaluate the assets to determine whether we can close them
         for line in self:
@@ -717,7 +1005,21 @@ class AccountAssetDepreciationLine(models.Model):
                 msg = _format_message(_('Depreciation line posted.'), msg_values)
                 line.asset_id.message_post(body=msg)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountAssetDepreciationLine, self).create(vals_list)
+        self.env['asset.asset.report']._schedule_refresh(lines.asset_id.ids)
+        return lines
+
+    def write(self, vals):
+        assets = self.asset_id
+        res = super(AccountAssetDepreciationLine, self).write(vals)
+        if any(field_name in vals for field_name in ('name', 'amount', 'depreciation_date', 'move_id', 'move_check', 'asset_id')):
+            self.env['asset.asset.report']._schedule_refresh((assets | self.asset_id).ids)
+        return res
+
     def unlink(self):
+        self.env['asset.asset.report']._schedule_refresh(self.asset_id.ids)
         for record in self:
             if record.move_check:
                 if record.asset_id.category_id.type == 'purchase':
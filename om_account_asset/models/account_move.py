@@ -44,11 +44,10 @@ class AccountMove(models.Model):
 
     def action_post(self):
         result = super(AccountMove, self).action_post()
-        for inv in self:
-            context = dict(self.env.context)
-            context.pop('default_type', None)
-            for mv_line in inv.invoice_line_ids:
-                mv_line.with_context(context).asset_create()
+        context = dict(self.env.context)
+        context.pop('default_type', None)
+        # create the assets of all the posted moves at once
+        self.invoice_line_ids.with_context(context)._create_assets()
         return result
 
 
@@ -111,32 +110,58 @@ class AccountMoveLine(models.Model):
                     rec.asset_start_date = start_date
                     rec.asset_end_date = end_date
 
-    def asset_create(self):
-        if self.asset_category_id:
-            price_subtotal = self.currency_id._convert(
-                self.price_subtotal,
-                self.company_currency_id,
-                self.company_id,
-                self.move_id.invoice_date or fields.Date.context_today(
-                    self))
-            vals = {
-                'name': self.name,
-                'code': self.name or False,
-                'category_id': self.asset_category_id.id,
-                'value': price_subtotal,
-                'partner_id': self.move_id.partner_id.id,
-                'company_id': self.move_id.company_id.id,
-                'currency_id': self.move_id.company_currency_id.id,
-                'date': self.move_id.invoice_date or self.move_id.date,
-                'invoice_id': self.move_id.id,
-            }
+    def _prepare_asset_vals(self, category_values=None):
+        """ Values of the asset to create from the move line, or None if the line has no asset category.
+
+        :param category_values: optional cache of the asset values derived from each category
+        """
+        self.ensure_one()
+        if not self.asset_category_id:
+            return None
+        price_subtotal = self.currency_id._convert(
+            self.price_subtotal,
+            self.company_currency_id,
+            self.company_id,
+            self.move_id.invoice_date or fields.Date.context_today(
+                self))
+        vals = {
+            'name': self.name,
+            'code': self.name or False,
+            'category_id': self.asset_category_id.id,
+            'value': price_subtotal,
+            'partner_id': self.move_id.partner_id.id,
+            'company_id': self.move_id.company_id.id,
+            'currency_id': self.move_id.company_currency_id.id,
+            'date': self.move_id.invoice_date or self.move_id.date,
+            'invoice_id': self.move_id.id,
+        }
+        if category_values is None:
+            category_values = {}
+        if vals['category_id'] not in category_values:
             changed_vals = self.env['account.asset.asset'].onchange_category_id_values(vals['category_id'])
-            vals.update(changed_vals['value'])
-            asset = self.env['account.asset.asset'].create(vals)
-            if self.asset_category_id.open_asset:
-                if asset.date_first_depreciation == 'manual':
-                    asset.first_depreciation_manual_date = asset.date
-                asset.validate()
+            category_values[vals['category_id']] = changed_vals['value']
+        vals.update(category_values[vals['category_id']])
+        if self.asset_category_id.open_asset and vals.get('date_first_depreciation') == 'manual':
+            vals['first_depreciation_manual_date'] = vals['date']
+        return vals
+
+    def _create_assets(self):
+        """ Create the assets of the move lines with a single create, and confirm
+        those whose category is automatically confirmed. """
+        category_values = {}
+        vals_list = []
+        for line in self:
+            vals = line._prepare_asset_vals(category_values)
+            if vals:
+                vals_list.append(vals)
+        if not vals_list:
+            return self.env['account.asset.asset']
+        assets = self.env['account.asset.asset'].create(vals_list)
+        assets.filtered(lambda asset: asset.category_id.open_asset).validate()
+        return assets
+
+    def asset_create(self):
+        self._create_assets()
         return True
 
     @api.onchange('asset_category_id', 'product_uom_id')
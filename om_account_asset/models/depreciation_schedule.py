@@ -0,0 +1,162 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+"""Side-effect free depreciation schedule engine.
+
+The functions of this module mirror the computation of
+``account.asset.asset.compute_depreciation_board`` on plain dictionaries, so
+that schedules can be projected or simulated for a whole asset register
+without reading records one by one nor writing depreciation lines.
+
+An asset is described by a dictionary with the keys returned by
+``account.asset.asset._get_schedule_params``.
+"""
+import calendar
+from datetime import date
+from functools import lru_cache
+
+from dateutil.relativedelta import relativedelta
+
+from odoo.tools import float_is_zero, float_round
+
+
+def _first_depreciation_date(params):
+    if params['last_posted_date']:
+        return params['last_posted_date'] + relativedelta(months=+params['method_period'])
+    depreciation_date = params['date']
+    if params['date_first_depreciation'] == 'last_day_period':
+        depreciation_date = depreciation_date + relativedelta(day=31)
+        if params['method_period'] == 12:
+            depreciation_date = depreciation_date + relativedelta(month=int(params['fiscalyear_last_month']))
+            depreciation_date = depreciation_date + relativedelta(day=int(params['fiscalyear_last_day']))
+            if depreciation_date < params['date']:
+                depreciation_date = depreciation_date + relativedelta(years=1)
+    elif params['first_depreciation_manual_date'] and params['first_depreciation_manual_date'] != params['date']:
+        depreciation_date = params['first_depreciation_manual_date']
+    return depreciation_date
+
+
+def _undone_dotation_number(params, depreciation_date):
+    undone_dotation_number = params['method_number']
+    if params['method_time'] == 'end':
+        undone_dotation_number = 0
+        while depreciation_date <= params['method_end']:
+            depreciation_date = depreciation_date + relativedelta(months=+params['method_period'])
+            undone_dotation_number += 1
+    if params['prorata']:
+        undone_dotation_number += 1
+    return undone_dotation_number
+
+
+@lru_cache(maxsize=4096)
+def _date_series(start, method_period, count, fix_month_day, fix_last_day):
+    """ Depreciation dates of a schedule. Assets sharing the same start date and
+    periodicity share the same series, which is computed only once. """
+    month_day = start.day
+    depreciation_date = start
+    series = [depreciation_date]
+    for dummy in range(count - 1):
+        depreciation_date = depreciation_date + relativedelta(months=+method_period)
+        if fix_month_day and month_day > 28:
+            max_day_in_month = calendar.monthrange(depreciation_date.year, depreciation_date.month)[1]
+            depreciation_date = depreciation_date.replace(day=min(max_day_in_month, month_day))
+        if fix_last_day:
+            max_day_in_month = calendar.monthrange(depreciation_date.year, depreciation_date.month)[1]
+            depreciation_date = depreciation_date.replace(day=max_day_in_month)
+        series.append(depreciation_date)
+    return tuple(series)
+
+
+def _first_amount_ratio(params, total_days):
+    """ Share of a full period depreciated by the first prorata temporis entry. """
+    asset_date = params['date']
+    if params['method_period'] % 12 != 0:
+        month_days = calendar.monthrange(asset_date.year, asset_date.month)[1]
+        return (month_days - asset_date.day + 1) / month_days
+    return ((params['fiscalyear_date_to'] - asset_date).days + 1) / total_days
+
+
+def compute_schedule(params, date_to=None):
+    """ Compute the depreciation lines to come for one asset.
+
+    :param params: dictionary describing the asset, see ``_get_schedule_params``
+    :param date_to: optional date after which the schedule is truncated
+    :return: list of ``(sequence, depreciation_date, amount)`` tuples
+    """
+    rounding = params['rounding']
+    residual_amount = amount_to_depr = params['value_residual']
+    if float_is_zero(residual_amount, precision_rounding=rounding):
+        return []
+
+    start = _first_depreciation_date(params)
+    total_days = (start.year % 4) and 365 or 366
+    undone_dotation_number = _undone_dotation_number(params, start)
+    posted_count = params['posted_count']
+    if undone_dotation_number <= posted_count:
+        return []
+
+    dates = _date_series(
+        start, params['method_period'], undone_dotation_number - posted_count,
+        params['date_first_depreciation'] == 'manual',
+        not params['prorata'] and params['method_period'] % 12 != 0 and params['date_first_depreciation'] == 'last_day_period',
+    )
+    linear = params['method'] == 'linear'
+    if linear:
+        if params['prorata']:
+            period_amount = amount_to_depr / params['method_number']
+        else:
+            period_amount = amount_to_depr / (undone_dotation_number - posted_count)
+    factor = params['method_progress_factor']
+
+    schedule = []
+    date_index = 0
+    for sequence in range(posted_count + 1, undone_dotation_number + 1):
+        depreciation_date = dates[date_index]
+        if date_to and depreciation_date > date_to:
+            break
+        if sequence == undone_dotation_number:
+            amount = residual_amount
+        elif linear:
+            amount = period_amount
+            if params['prorata'] and sequence == 1:
+                amount = period_amount * _first_amount_ratio(params, total_days)
+        elif params['method'] == 'degressive':
+            amount = residual_amount * factor
+            if params['prorata'] and sequence == 1:
+                amount = amount * _first_amount_ratio(params, total_days)
+        else:
+            amount = 0
+        amount = float_round(amount, precision_rounding=rounding)
+        if float_is_zero(amount, precision_rounding=rounding):
+            # as in the board, a skipped entry does not consume a date
+            continue
+        residual_amount -= amount
+        schedule.append((sequence, depreciation_date, amount))
+        date_index += 1
+    return schedule
+
+
+def compute_schedules(params_list, date_to=None):
+    """ Compute the schedules of many assets at once.
+
+    :return: dictionary ``{asset_id: [(sequence, depreciation_date, amount), ...]}``
+    """
+    return {params['id']: compute_schedule(params, date_to=date_to) for params in params_list}
+
+
+def aggregate_by_period(schedules, key_by_asset, period_start=None):
+    """ Sum the schedules per ``(key, period)``.
+
+    :param schedules: result of ``compute_schedules``
+    :param key_by_asset: dictionary giving the grouping key of every asset
+    :param period_start: function mapping a date to its period, defaults to the first day of its month
+    :return: dictionary ``{(key, period): (amount, entry_count)}``, ``entry_count`` being
+             the number of depreciation entries of the period
+    """
+    period_start = period_start or (lambda d: date(d.year, d.month, 1))
+    totals = {}
+    for asset_id, schedule in schedules.items():
+        key = key_by_asset[asset_id]
+        for dummy, depreciation_date, amount in schedule:
+            group = (key, period_start(depreciation_date))
+            total_amount, entry_count = totals.get(group, (0.0, 0))
+            totals[group] = (total_amount + amount, entry_count + 1)
+    return totals
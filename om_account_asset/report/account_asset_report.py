@@ -23,43 +23,118 @@ class AssetAssetReport(models.Model):
     unposted_value = fields.Float(string='Unposted Amount', readonly=True)
     company_id = fields.Many2one('res.company', string='Company', readonly=True)
 
+    _refresh_key = 'asset.asset.report.refresh'
+
     def init(self):
+        # The analysis used to be a plain view, re-aggregating all the depreciation
+        # lines on every access. It is now a table kept up to date per asset.
         tools.drop_view_if_exists(self._cr, 'asset_asset_report')
         self._cr.execute("""
-            create or replace view asset_asset_report as (
-                select
-                    min(dl.id) as id,
-                    dl.name as name,
-                    dl.depreciation_date as depreciation_date,
-                    a.date as date,
-                    (CASE WHEN dlmin.id = min(dl.id)
-                      THEN a.value
-                      ELSE 0
-                      END) as gross_value,
-                    dl.amount as depreciation_value,
-                    dl.amount as installment_value,
-                    (CASE WHEN dl.move_check
-                      THEN dl.amount
-                      ELSE 0
-                      END) as posted_value,
-                    (CASE WHEN NOT dl.move_check
-                      THEN dl.amount
-                      ELSE 0
-                      END) as unposted_value,
-                    dl.asset_id as asset_id,
-                    dl.move_check as move_check,
-                    a.category_id as asset_category_id,
-                    a.partner_id as partner_id,
-                    a.state as state,
-                    count(dl.*) as installment_nbr,
-                    count(dl.*) as depreciation_nbr,
-                    a.company_id as company_id
-                from account_asset_depreciation_line dl
-                    left join account_asset_asset a on (dl.asset_id=a.id)
-                    left join (select min(d.id) as id,ac.id as ac_id from account_asset_depreciation_line as d inner join account_asset_asset as ac ON (ac.id=d.asset_id) group by ac_id) as dlmin on dlmin.ac_id=a.id
-                where a.active is true 
-                group by
-                    dl.amount,dl.asset_id,dl.depreciation_date,dl.name,
-                    a.date, dl.move_check, a.state, a.category_id, a.partner_id, a.company_id,
-                    a.value, a.id, a.salvage_value, dlmin.id
-        )""")
+            CREATE TABLE IF NOT EXISTS asset_asset_report (
+                id integer PRIMARY KEY,
+                name varchar,
+                depreciation_date date,
+                date date,
+                gross_value numeric,
+                depreciation_value numeric,
+                installment_value numeric,
+                posted_value numeric,
+                unposted_value numeric,
+                asset_id integer REFERENCES account_asset_asset(id) ON DELETE CASCADE,
+                move_check boolean,
+                asset_category_id integer,
+                partner_id integer,
+                state varchar,
+                installment_nbr integer,
+                depreciation_nbr integer,
+                company_id integer
+            )""")
+        tools.create_index(self._cr, 'asset_asset_report_asset_id_index', 'asset_asset_report', ['asset_id'])
+        tools.create_index(
+            self._cr, 'asset_asset_report_company_category_date_index', 'asset_asset_report',
+            ['company_id', 'asset_category_id', 'depreciation_date'])
+        self._refresh()
+
+    def _select(self):
+        return """
+            select
+                min(dl.id) as id,
+                dl.name as name,
+                dl.depreciation_date as depreciation_date,
+                a.date as date,
+                (CASE WHEN dlmin.id = min(dl.id)
+                  THEN a.value
+                  ELSE 0
+                  END) as gross_value,
+                dl.amount as depreciation_value,
+                dl.amount as installment_value,
+                (CASE WHEN dl.move_check
+                  THEN dl.amount
+                  ELSE 0
+                  END) as posted_value,
+                (CASE WHEN NOT dl.move_check
+                  THEN dl.amount
+                  ELSE 0
+                  END) as unposted_value,
+                dl.asset_id as asset_id,
+                dl.move_check as move_check,
+                a.category_id as asset_category_id,
+                a.partner_id as partner_id,
+                a.state as state,
+                count(dl.*) as installment_nbr,
+                count(dl.*) as depreciation_nbr,
+                a.company_id as company_id
+            from account_asset_depreciation_line dl
+                left join account_asset_asset a on (dl.asset_id=a.id)
+                left join (select min(d.id) as id,ac.id as ac_id from account_asset_depreciation_line as d inner join account_asset_asset as ac ON (ac.id=d.asset_id) %(asset_where)s group by ac_id) as dlmin on dlmin.ac_id=a.id
+            where a.active is true %(line_where)s
+            group by
+                dl.amount,dl.asset_id,dl.depreciation_date,dl.name,
+                a.date, dl.move_check, a.state, a.category_id, a.partner_id, a.company_id,
+                a.value, a.id, a.salvage_value, dlmin.id
+        """
+
+    def _refresh(self, asset_ids=None):
+        """ Rebuild the analysis rows of the given assets, or of all assets if None. """
+        if asset_ids is not None and not asset_ids:
+            return
+        self.env['account.asset.asset'].flush_model()
+        self.env['account.asset.depreciation.line'].flush_model()
+        columns = ('id, name, depreciation_date, date, gross_value, depreciation_value, installment_value, '
+                   'posted_value, unposted_value, asset_id, move_check, asset_category_id, partner_id, '
+                   'state, installment_nbr, depreciation_nbr, company_id')
+        if asset_ids is None:
+            self._cr.execute("TRUNCATE asset_asset_report")
+            select = self._select() % {'asset_where': '', 'line_where': ''}
+            params = ()
+        else:
+            asset_ids = list(asset_ids)
+            self._cr.execute("DELETE FROM asset_asset_report WHERE asset_id = ANY(%s)", (asset_ids,))
+            select = self._select() % {
+                'asset_where': 'where ac.id = ANY(%s)',
+                'line_where': 'and dl.asset_id = ANY(%s)',
+            }
+            params = (asset_ids, asset_ids)
+        self._cr.execute("INSERT INTO asset_asset_report (%s) %s" % (columns, select), params)
+        self.invalidate_model()
+
+    @api.model
+    def _schedule_refresh(self, asset_ids):
+        """ Refresh the rows of the given assets once, right before the transaction commits. """
+        asset_ids = set(asset_ids)
+        if not asset_ids:
+            return
+        pending = self.env.cr.precommit.data.setdefault(self._refresh_key, set())
+        if not pending:
+            report = self.sudo()
+
+            @self.env.cr.precommit.add
+            def _refresh_pending():
+                report._refresh(report.env.cr.precommit.data.pop(report._refresh_key, set()))
+
+        pending.update(asset_ids)
+
+    @api.model
+    def action_refresh(self):
+        self.sudo()._refresh()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
@@ -2,3 +2,6 @@
 
 from . import asset_depreciation_confirmation_wizard
 from . import asset_modify
+from . import asset_depreciation_simulation
+from . import asset_roll_forward
+from . import asset_disposal
@@ -0,0 +1,88 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+from ..models.depreciation_schedule import aggregate_by_period
+
+
+class AssetDepreciationSimulation(models.TransientModel):
+    _name = 'asset.depreciation.simulation'
+    _description = 'Asset Depreciation Simulation'
+
+    category_ids = fields.Many2many(
+        'account.asset.category', string='Asset Categories',
+        domain=[('type', '=', 'purchase')],
+        help="Leave empty to project the whole asset register."
+    )
+    date_to = fields.Date(
+        string='Project Until', required=True,
+        default=lambda self: fields.Date.context_today(self) + relativedelta(years=5)
+    )
+    override_method = fields.Boolean(
+        string='Simulate Another Method',
+        help="Project the depreciation as if the selected assets were depreciated with the method below."
+    )
+    method = fields.Selection(
+        [('linear', 'Linear'), ('degressive', 'Degressive')],
+        string='Computation Method', default='linear'
+    )
+    method_number = fields.Integer(string='Number of Depreciations', default=5)
+    method_period = fields.Integer(string='Number of Months in a Period', default=12)
+    method_progress_factor = fields.Float(string='Degressive Factor', default=0.3)
+    line_ids = fields.One2many('asset.depreciation.simulation.line', 'simulation_id', string='Projection')
+
+    def _get_overrides(self):
+        self.ensure_one()
+        if not self.override_method:
+            return {}
+        if self.method_number <= 0 or self.method_period <= 0:
+            raise UserError(_('The number of depreciations and the period length must be greater than 0.'))
+        return {
+            'method': self.method,
+            'method_number': self.method_number,
+            'method_period': self.method_period,
+            'method_progress_factor': self.method_progress_factor,
+            'method_time': 'number',
+        }
+
+    def action_simulate(self):
+        self.ensure_one()
+        domain = [('state', '=', 'open'), ('type', '=', 'purchase')]
+        if self.category_ids:
+            domain.append(('category_id', 'in', self.category_ids.ids))
+        assets = self.env['account.asset.asset'].search(domain)
+        schedules = assets._simulate_depreciation_schedules(overrides=self._get_overrides(), date_to=self.date_to)
+        totals = aggregate_by_period(schedules, {asset.id: asset.category_id.id for asset in assets})
+
+        self.line_ids.unlink()
+        self.env['asset.depreciation.simulation.line'].create([{
+            'simulation_id': self.id,
+            'category_id': category_id,
+            'date': period,
+            'amount': amount,
+            'entry_count': entry_count,
+        } for (category_id, period), (amount, entry_count) in totals.items()])
+
+        return {
+            'name': _('Depreciation Projection'),
+            'view_mode': 'pivot,graph,list',
+            'res_model': 'asset.depreciation.simulation.line',
+            'type': 'ir.actions.act_window',
+            'domain': [('simulation_id', '=', self.id)],
+            'context': {'search_default_group_category': 1},
+        }
+
+
+class AssetDepreciationSimulationLine(models.TransientModel):
+    _name = 'asset.depreciation.simulation.line'
+    _description = 'Asset Depreciation Projection Line'
+    _order = 'date, category_id'
+
+    simulation_id = fields.Many2one('asset.depreciation.simulation', required=True, ondelete='cascade')
+    category_id = fields.Many2one('account.asset.category', string='Asset Category', readonly=True)
+    date = fields.Date(string='Depreciation Month', readonly=True)
+    amount = fields.Float(string='Depreciation', readonly=True)
+    entry_count = fields.Integer(string='# Entries', readonly=True)
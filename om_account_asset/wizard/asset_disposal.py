@@ -0,0 +1,42 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class AssetDisposal(models.TransientModel):
+    _name = 'asset.disposal'
+    _description = 'Dispose Assets'
+
+    asset_ids = fields.Many2many(
+        'account.asset.asset', string='Assets', required=True,
+        domain=[('state', '=', 'open')],
+        default=lambda self: self._default_asset_ids()
+    )
+    date = fields.Date(
+        string='Disposal Date', required=True,
+        default=fields.Date.context_today
+    )
+    group_entries = fields.Selection(
+        [('asset', 'One Entry per Asset'), ('category', 'One Entry per Category')],
+        string='Journal Entries', required=True, default='asset'
+    )
+
+    @api.model
+    def _default_asset_ids(self):
+        if self.env.context.get('active_model') != 'account.asset.asset':
+            return False
+        assets = self.env['account.asset.asset'].browse(self.env.context.get('active_ids', []))
+        return assets.filtered(lambda asset: asset.state == 'open')
+
+    def action_dispose(self):
+        self.ensure_one()
+        if any(asset.state != 'open' for asset in self.asset_ids):
+            raise UserError(_('Only running assets can be sold or disposed.'))
+        move_ids = self.asset_ids._get_disposal_moves(
+            disposal_date=self.date,
+            group_by_category=self.group_entries == 'category',
+        )
+        if not move_ids:
+            raise UserError(_('The selected assets have no remaining value to dispose of.'))
+        return self.asset_ids._return_disposal_view(move_ids)
@@ -0,0 +1,207 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import base64
+import io
+
+import xlsxwriter
+
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+from odoo.tools import date_utils
+
+ROLL_FORWARD_COLUMNS = [
+    'opening_gross', 'additions', 'disposals', 'closing_gross',
+    'opening_depreciation', 'depreciation_charge', 'disposal_depreciation', 'closing_depreciation',
+    'opening_nbv', 'closing_nbv',
+]
+
+
+class AssetRollForward(models.TransientModel):
+    _name = 'asset.roll.forward'
+    _description = 'Fixed Asset Roll-Forward'
+
+    date_from = fields.Date(
+        string='Start Date', required=True,
+        default=lambda self: date_utils.start_of(fields.Date.context_today(self), 'year')
+    )
+    date_to = fields.Date(
+        string='End Date', required=True,
+        default=lambda self: date_utils.end_of(fields.Date.context_today(self), 'year')
+    )
+    company_id = fields.Many2one(
+        'res.company', string='Company', required=True,
+        default=lambda self: self.env.company
+    )
+    category_ids = fields.Many2many(
+        'account.asset.category', string='Asset Categories',
+        domain=[('type', '=', 'purchase')],
+        help="Leave empty to report on all the asset categories."
+    )
+    line_ids = fields.One2many('asset.roll.forward.line', 'roll_forward_id', string='Roll-Forward')
+    file_data = fields.Binary(string='File', readonly=True, attachment=False)
+    file_name = fields.Char(string='File Name', readonly=True)
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for wizard in self:
+            if wizard.date_from > wizard.date_to:
+                raise ValidationError(_('The start date must be anterior to the end date.'))
+
+    def _get_roll_forward_values(self):
+        """ Compute the roll-forward of the period per asset category in a single query.
+
+        A closed asset leaves the register, with its accumulated depreciation, on the
+        date of its last posted depreciation line. Draft and archived assets are ignored.
+
+        :return: list of dictionaries with the category id and the ``ROLL_FORWARD_COLUMNS`` amounts
+        """
+        self.ensure_one()
+        self.env['account.asset.asset'].flush_model()
+        self.env['account.asset.depreciation.line'].flush_model()
+        category_clause = ''
+        params = {
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'company_id': self.company_id.id,
+        }
+        if self.category_ids:
+            category_clause = 'AND a.category_id IN %(category_ids)s'
+            params['category_ids'] = tuple(self.category_ids.ids)
+        self._cr.execute("""
+            WITH posted AS (
+                SELECT dl.asset_id,
+                       SUM(dl.amount) FILTER (WHERE dl.depreciation_date < %(date_from)s) AS depreciation_before,
+                       SUM(dl.amount) FILTER (WHERE dl.depreciation_date <= %(date_to)s) AS depreciation_to,
+                       MAX(dl.depreciation_date) AS last_date
+                  FROM account_asset_depreciation_line dl
+                 WHERE dl.move_check IS TRUE
+              GROUP BY dl.asset_id
+            ), asset AS (
+                SELECT a.category_id,
+                       a.value,
+                       a.date,
+                       CASE WHEN a.state = 'close' THEN p.last_date END AS retired_date,
+                       COALESCE(p.depreciation_before, 0) AS depreciation_before,
+                       COALESCE(p.depreciation_to, 0) AS depreciation_to
+                  FROM account_asset_asset a
+                  JOIN account_asset_category c ON c.id = a.category_id
+             LEFT JOIN posted p ON p.asset_id = a.id
+                 WHERE a.active IS TRUE
+                   AND a.state != 'draft'
+                   AND c.type = 'purchase'
+                   AND a.company_id = %(company_id)s
+                   """ + category_clause + """
+            )
+            SELECT category_id,
+                   COALESCE(SUM(value) FILTER (
+                       WHERE date < %(date_from)s AND (retired_date IS NULL OR retired_date >= %(date_from)s)
+                   ), 0) AS opening_gross,
+                   COALESCE(SUM(value) FILTER (
+                       WHERE date BETWEEN %(date_from)s AND %(date_to)s
+                   ), 0) AS additions,
+                   COALESCE(SUM(value) FILTER (
+                       WHERE retired_date BETWEEN %(date_from)s AND %(date_to)s
+                   ), 0) AS disposals,
+                   COALESCE(SUM(depreciation_before) FILTER (
+                       WHERE retired_date IS NULL OR retired_date >= %(date_from)s
+                   ), 0) AS opening_depreciation,
+                   COALESCE(SUM(depreciation_to - depreciation_before), 0) AS depreciation_charge,
+                   COALESCE(SUM(depreciation_to) FILTER (
+                       WHERE retired_date BETWEEN %(date_from)s AND %(date_to)s
+                   ), 0) AS disposal_depreciation
+              FROM asset
+          GROUP BY category_id
+        """, params)
+        result = []
+        for row in self._cr.dictfetchall():
+            row['closing_gross'] = row['opening_gross'] + row['additions'] - row['disposals']
+            row['closing_depreciation'] = row['opening_depreciation'] + row['depreciation_charge'] - row['disposal_depreciation']
+            row['opening_nbv'] = row['opening_gross'] - row['opening_depreciation']
+            row['closing_nbv'] = row['closing_gross'] - row['closing_depreciation']
+            result.append(row)
+        return result
+
+    def action_view(self):
+        self.ensure_one()
+        self.line_ids.unlink()
+        self.env['asset.roll.forward.line'].create([
+            dict(values, roll_forward_id=self.id) for values in self._get_roll_forward_values()
+        ])
+        return {
+            'name': _('Fixed Asset Roll-Forward'),
+            'view_mode': 'list',
+            'res_model': 'asset.roll.forward.line',
+            'type': 'ir.actions.act_window',
+            'domain': [('roll_forward_id', '=', self.id)],
+        }
+
+    def action_export_xlsx(self):
+        self.ensure_one()
+        values = self._get_roll_forward_values()
+        categories = {
+            category.id: category.name
+            for category in self.env['account.asset.category'].browse([row['category_id'] for row in values])
+        }
+
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        sheet = workbook.add_worksheet(_('Roll-Forward'))
+        bold = workbook.add_format({'bold': True})
+        amount_format = workbook.add_format({'num_format': '#,##0.00'})
+        total_format = workbook.add_format({'num_format': '#,##0.00', 'bold': True})
+
+        sheet.write(0, 0, _('Fixed Asset Roll-Forward'), bold)
+        sheet.write(1, 0, '%s - %s' % (fields.Date.to_string(self.date_from), fields.Date.to_string(self.date_to)))
+        sheet.write(2, 0, self.company_id.name)
+        header_row = 4
+        sheet.write(header_row, 0, _('Asset Category'), bold)
+        line_fields = self.env['asset.roll.forward.line']._fields
+        for col, column in enumerate(ROLL_FORWARD_COLUMNS, start=1):
+            sheet.write(header_row, col, line_fields[column]._description_string(self.env), bold)
+        sheet.set_column(0, 0, 30)
+        sheet.set_column(1, len(ROLL_FORWARD_COLUMNS), 18)
+
+        totals = dict.fromkeys(ROLL_FORWARD_COLUMNS, 0.0)
+        row_index = header_row
+        for row in sorted(values, key=lambda r: categories.get(r['category_id']) or ''):
+            row_index += 1
+            sheet.write(row_index, 0, categories.get(row['category_id']) or '')
+            for col, column in enumerate(ROLL_FORWARD_COLUMNS, start=1):
+                sheet.write_number(row_index, col, float(row[column]), amount_format)
+                totals[column] += float(row[column])
+        row_index += 1
+        sheet.write(row_index, 0, _('Total'), bold)
+        for col, column in enumerate(ROLL_FORWARD_COLUMNS, start=1):
+            sheet.write_number(row_index, col, totals[column], total_format)
+        workbook.close()
+
+        self.write({
+            'file_data': base64.b64encode(output.getvalue()),
+            'file_name': 'asset_roll_forward_%s_%s.xlsx' % (
+                fields.Date.to_string(self.date_from), fields.Date.to_string(self.date_to)),
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/?model=%s&id=%s&field=file_data&filename_field=file_name&download=true' % (
+                self._name, self.id),
+            'target': 'self',
+        }
+
+
+class AssetRollForwardLine(models.TransientModel):
+    _name = 'asset.roll.forward.line'
+    _description = 'Fixed Asset Roll-Forward Line'
+    _order = 'category_id'
+
+    roll_forward_id = fields.Many2one('asset.roll.forward', required=True, ondelete='cascade')
+    category_id = fields.Many2one('account.asset.category', string='Asset Category', readonly=True)
+    opening_gross = fields.Float(string='Opening Gross', readonly=True)
+    additions = fields.Float(string='Additions', readonly=True)
+    disposals = fields.Float(string='Disposals', readonly=True)
+    closing_gross = fields.Float(string='Closing Gross', readonly=True)
+    opening_depreciation = fields.Float(string='Opening Depreciation', readonly=True)
+    depreciation_charge = fields.Float(string='Depreciation Charge', readonly=True)
+    disposal_depreciation = fields.Float(string='Depreciation on Disposals', readonly=True)
+    closing_depreciation = fields.Float(string='Closing Depreciation', readonly=True)
+    opening_nbv = fields.Float(string='Opening Net Book Value', readonly=True)
+    closing_nbv = fields.Float(string='Closing Net Book Value', readonly=True)
@@ -12,9 +12,12 @@
     'data': [
         'security/ir.model.access.csv',
         'security/security.xml',
+        'data/account_budget_data.xml',
+        'wizard/budget_line_generator_views.xml',
         'views/account_analytic_account_views.xml',
         'views/account_budget_views.xml',
         'views/res_config_settings_views.xml',
+        'report/budget_variance_report_views.xml',
     ],
     'images': ['static/description/banner.gif'],
     'demo': ['data/account_budget_demo.xml'],
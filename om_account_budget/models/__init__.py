@@ -1,2 +1,6 @@
 from . import account_budget
 from . import account_analytic_account
+from . import budget_actual
+from . import account_move
+from . import account_analytic_line
+from . import res_config_settings
@@ -0,0 +1,25 @@
+from odoo import api, models
+
+
+class AccountAnalyticLine(models.Model):
+    _inherit = "account.analytic.line"
+
+    _budget_actual_fields = ('account_id', 'general_account_id', 'date', 'amount', 'company_id')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountAnalyticLine, self).create(vals_list)
+        self.env['crossovered.budget.actual']._schedule_refresh('analytic', lines, 'general_account_id')
+        return lines
+
+    def write(self, vals):
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('analytic', self, 'general_account_id')
+        res = super(AccountAnalyticLine, self).write(vals)
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('analytic', self, 'general_account_id')
+        return res
+
+    def unlink(self):
+        self.env['crossovered.budget.actual']._schedule_refresh('analytic', self, 'general_account_id')
+        return super(AccountAnalyticLine, self).unlink()
@@ -1,5 +1,11 @@
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+
 from odoo import api, fields, models, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.osv.expression import AND, OR
+from odoo.tools import split_every
 
 
 class AccountBudgetPost(models.Model):
@@ -58,6 +64,14 @@ class CrossoveredBudget(models.Model):
     )
     company_id = fields.Many2one('res.company', 'Company', required=True, default=lambda self: self.env.company)
 
+    def write(self, vals):
+        if 'company_id' in vals:
+            company_ids = set(self.env['crossovered.budget.actual']._get_budget_company_ids())
+        res = super(CrossoveredBudget, self).write(vals)
+        if 'company_id' in vals:
+            self.crossovered_budget_line._refresh_actuals_of_new_companies(company_ids)
+        return res
+
     def action_budget_confirm(self):
         self.write({'state': 'confirm'})
 
@@ -100,8 +114,41 @@ class CrossoveredBudgetLines(models.Model):
         help="Comparison between practical and theoretical amount. This measure tells you if you are below or over budget.")
     company_id = fields.Many2one(related='crossovered_budget_id.company_id', comodel_name='res.company',
         string='Company', store=True, readonly=True)
-    is_above_budget = fields.Boolean(compute='_is_above_budget')
+    is_above_budget = fields.Boolean(compute='_is_above_budget', search='_search_is_above_budget')
     crossovered_budget_state = fields.Selection(related='crossovered_budget_id.state', string='Budget State', store=True, readonly=True)
+    # stored copies of the amounts above, refreshed every night and when items are
+    # posted, so that the budget lines can be filtered and sorted in the database
+    stored_practical_amount = fields.Monetary('Practical Amount (Stored)', readonly=True, copy=False)
+    stored_theoritical_amount = fields.Monetary('Theoretical Amount (Stored)', readonly=True, copy=False)
+    stored_percentage = fields.Float('Achievement (Stored)', readonly=True, copy=False)
+    stored_is_above_budget = fields.Boolean('Above Budget (Stored)', readonly=True, copy=False, index=True)
+    amounts_refresh_date = fields.Datetime('Amounts Refreshed On', readonly=True, copy=False)
+
+    _stored_amounts_refresh_key = 'crossovered.budget.lines.refresh'
+    _headroom_consumed_key = 'crossovered.budget.lines.consumed'
+    _stored_amounts_fields = ('analytic_account_id', 'general_budget_id', 'date_from', 'date_to',
+                              'paid_date', 'planned_amount')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        company_ids = set(self.env['crossovered.budget.actual']._get_budget_company_ids())
+        lines = super(CrossoveredBudgetLines, self).create(vals_list)
+        lines._refresh_actuals_of_new_companies(company_ids)
+        lines._schedule_stored_amounts_refresh()
+        return lines
+
+    def write(self, vals):
+        res = super(CrossoveredBudgetLines, self).write(vals)
+        if any(field_name in vals for field_name in self._stored_amounts_fields):
+            self._schedule_stored_amounts_refresh()
+        return res
+
+    def _refresh_actuals_of_new_companies(self, company_ids):
+        """ Rebuild the actuals of the companies of the lines that are not in ``company_ids``: the
+        actuals are only kept up to date for the companies with budget lines. """
+        new_company_ids = set(self.company_id.ids) - company_ids
+        if new_company_ids:
+            self.env['crossovered.budget.actual'].sudo()._refresh(company_ids=new_company_ids)
 
     @api.model
     def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
@@ -111,6 +158,10 @@ class CrossoveredBudgetLines(models.Model):
         result = super(CrossoveredBudgetLines, self).read_group(domain, fields, groupby, offset=offset, limit=limit,
                                                                 orderby=orderby, lazy=lazy)
         if any(x in fields for x in fields_list):
+            # compute the amounts of all the lines of all the groups at once: the groups
+            # below only read them back from the cache
+            all_budget_lines = self.search(domain)
+            all_budget_lines.mapped('percentage')
             for group_line in result:
 
                 # initialise fields to compute to 0 if they are requested
@@ -124,9 +175,9 @@ class CrossoveredBudgetLines(models.Model):
                     group_line['theoritical_amount'] = 0
 
                 if group_line.get('__domain'):
-                    all_budget_lines_that_compose_group = self.search(group_line['__domain'])
+                    all_budget_lines_that_compose_group = all_budget_lines.filtered_domain(group_line['__domain'])
                 else:
-                    all_budget_lines_that_compose_group = self.search([])
+                    all_budget_lines_that_compose_group = all_budget_lines
                 for budget_line_of_group in all_budget_lines_that_compose_group:
                     if 'practical_amount' in fields or 'percentage' in fields:
                         group_line['practical_amount'] += budget_line_of_group.practical_amount
@@ -134,11 +185,11 @@ class CrossoveredBudgetLines(models.Model):
                     if 'theoritical_amount' in fields or 'percentage' in fields:
                         group_line['theoritical_amount'] += budget_line_of_group.theoritical_amount
 
-                    if 'percentage' in fields:
-                        if group_line['theoritical_amount']:
-                            # use a weighted average
-                            group_line['percentage'] = float(
-                                (group_line['practical_amount'] or 0.0) / group_line['theoritical_amount']) * 100
+                if 'percentage' in fields:
+                    if group_line['theoritical_amount']:
+                        # use a weighted average
+                        group_line['percentage'] = float(
+                            (group_line['practical_amount'] or 0.0) / group_line['theoritical_amount']) * 100
 
         return result
 
@@ -149,6 +200,11 @@ class CrossoveredBudgetLines(models.Model):
             else:
                 line.is_above_budget = line.practical_amount < line.theoritical_amount
 
+    def _search_is_above_budget(self, operator, value):
+        if operator not in ('=', '!='):
+            raise UserError(_('Operation not supported'))
+        return [('stored_is_above_budget', operator, bool(value))]
+
     def _compute_line_name(self):
         #just in case someone opens the budget line in form view
         for line in self:
@@ -160,44 +216,136 @@ class CrossoveredBudgetLines(models.Model):
             line.name = computed_name
 
     def _compute_practical_amount(self):
+        # the whole months of the periods are read from the actuals per account and month,
+        # only the remaining days at both ends of a period are summed from the items;
+        # analytic items for the lines with an analytic account, journal items for the others
+        pending_keys = self.env['crossovered.budget.actual']._get_pending_keys()
+        analytic_budget_lines = self.filtered('analytic_account_id')
+        move_budget_lines = self - analytic_budget_lines
+        analytic_months, analytic_days = analytic_budget_lines._get_practical_windows('analytic', pending_keys)
+        move_months, move_days = move_budget_lines._get_practical_windows('move', pending_keys)
+        practical_amounts = defaultdict(float)
+        for amounts in (
+            self._get_practical_amounts(
+                'crossovered.budget.actual', analytic_months,
+                "SUM(crossovered_budget_actual.amount)",
+                """crossovered_budget_actual.source = 'analytic'
+                   AND crossovered_budget_actual.analytic_account_id = budget_line.analytic_account_id
+                   AND crossovered_budget_actual.month BETWEEN budget_line.date_from AND budget_line.date_to
+                   AND (budget_line.account_ids IS NULL
+                        OR crossovered_budget_actual.account_id = ANY(budget_line.account_ids))""",
+            ),
+            self._get_practical_amounts(
+                'account.analytic.line', analytic_days,
+                "SUM(account_analytic_line.amount)",
+                """account_analytic_line.account_id = budget_line.analytic_account_id
+                   AND account_analytic_line.date BETWEEN budget_line.date_from AND budget_line.date_to
+                   AND (budget_line.account_ids IS NULL
+                        OR account_analytic_line.general_account_id = ANY(budget_line.account_ids))""",
+            ),
+            self._get_practical_amounts(
+                'crossovered.budget.actual', move_months,
+                "SUM(crossovered_budget_actual.amount)",
+                """crossovered_budget_actual.source = 'move'
+                   AND crossovered_budget_actual.account_id = ANY(budget_line.account_ids)
+                   AND crossovered_budget_actual.month BETWEEN budget_line.date_from AND budget_line.date_to""",
+            ),
+            self._get_practical_amounts(
+                'account.move.line', move_days,
+                "SUM(account_move_line.credit) - SUM(account_move_line.debit)",
+                """account_move_line.account_id = ANY(budget_line.account_ids)
+                   AND account_move_line.date BETWEEN budget_line.date_from AND budget_line.date_to""",
+            ),
+        ):
+            for line, amount in amounts.items():
+                practical_amounts[line] += amount
         for line in self:
-            acc_ids = line.general_budget_id.account_ids.ids
-            date_to = line.date_to
-            date_from = line.date_from
-            if line.analytic_account_id.id:
-                analytic_line_obj = self.env['account.analytic.line']
-                domain = [('account_id', '=', line.analytic_account_id.id),
-                          ('date', '>=', date_from),
-                          ('date', '<=', date_to),
-                          ]
-                if acc_ids:
-                    domain += [('general_account_id', 'in', acc_ids)]
-
-                where_query = analytic_line_obj._where_calc(domain)
-                analytic_line_obj._apply_ir_rules(where_query, 'read')
-                from_string, from_params = where_query.from_clause
-                where_string, where_params = where_query.where_clause
-                from_clause, where_clause, where_clause_params = from_string, where_string, from_params + where_params
-
-                select = "SELECT SUM(amount) from " + from_clause + " where " + where_clause
-
-            else:
-                aml_obj = self.env['account.move.line']
-                domain = [('account_id', 'in',
-                           line.general_budget_id.account_ids.ids),
-                          ('date', '>=', date_from),
-                          ('date', '<=', date_to)
-                          ]
-                where_query = aml_obj._where_calc(domain)
-                aml_obj._apply_ir_rules(where_query, 'read')
-                from_string, from_params = where_query.from_clause
-                where_string, where_params = where_query.where_clause
-                from_clause, where_clause, where_clause_params = from_string, where_string, from_params + where_params
-
-                select = "SELECT sum(credit)-sum(debit) from " + from_clause + " where " + where_clause
-
-            self.env.cr.execute(select, where_clause_params)
-            line.practical_amount = self.env.cr.fetchone()[0] or 0.0
+            line.practical_amount = practical_amounts.get(line, 0.0)
+
+    def _get_practical_windows(self, source, pending_keys=()):
+        """ Split the period of every budget line into the whole months it covers and the
+        remaining days at both ends.
+
+        The actuals of the ``(source, account_id, month)`` keys in ``pending_keys`` are not
+        refreshed yet: the whole period of the lines covering one of them is read from the
+        items, so that reading the amounts never writes the actuals.
+
+        :return: two lists of ``(budget line, date_from, date_to)``: the whole months, then the days
+        """
+        pending_months = defaultdict(set)
+        for key_source, account_id, month in pending_keys:
+            if key_source == source:
+                pending_months[account_id].add(month)
+        month_windows = []
+        day_windows = []
+        for line in self:
+            if not line.date_from or not line.date_to:
+                continue
+            first_month = fields.Date.start_of(line.date_from, 'month')
+            if first_month != line.date_from:
+                first_month += relativedelta(months=1)
+            last_month_end = fields.Date.end_of(line.date_to, 'month')
+            if last_month_end != line.date_to:
+                last_month_end = fields.Date.start_of(line.date_to, 'month') - relativedelta(days=1)
+            if first_month > last_month_end:
+                day_windows.append((line, line.date_from, line.date_to))
+                continue
+            # the lines without budgetary position cover the items of any account
+            account_ids = line.general_budget_id.account_ids.ids or list(pending_months)
+            if any(first_month <= month <= last_month_end
+                   for account_id in account_ids for month in pending_months.get(account_id, ())):
+                day_windows.append((line, line.date_from, line.date_to))
+                continue
+            month_windows.append((line, first_month, last_month_end))
+            if line.date_from < first_month:
+                day_windows.append((line, line.date_from, first_month - relativedelta(days=1)))
+            if last_month_end < line.date_to:
+                day_windows.append((line, last_month_end + relativedelta(days=1), line.date_to))
+        return month_windows, day_windows
+
+    def _get_practical_amounts(self, model_name, windows, amount_select, join_condition):
+        """ Sum the amounts of ``model_name`` matching every window in a single query.
+
+        The windows are joined to the items as a VALUES list of the analytic account,
+        dates and budgetary position accounts of their budget line, and the record
+        rules of ``model_name`` are applied.
+
+        :param windows: list of ``(budget line, date_from, date_to)``
+        :return: dictionary {budget line: practical amount}
+        """
+        if not windows:
+            return {}
+        model = self.env[model_name]
+        model.flush_model()
+        where_query = model._where_calc([])
+        model._apply_ir_rules(where_query, 'read')
+        from_string, from_params = where_query.from_clause
+        where_string, where_params = where_query.where_clause
+
+        values = []
+        values_params = []
+        for index, (line, date_from, date_to) in enumerate(windows):
+            values.append("(%s, %s, %s::date, %s::date, %s::int[])")
+            values_params += [
+                index,
+                line.analytic_account_id.id or None,
+                date_from,
+                date_to,
+                line.general_budget_id.account_ids.ids or None,
+            ]
+        select = (
+            "SELECT budget_line.line_index, " + amount_select +
+            " FROM " + from_string +
+            " JOIN (VALUES " + ", ".join(values) + ") AS budget_line"
+            "(line_index, analytic_account_id, date_from, date_to, account_ids) ON " + join_condition +
+            (" WHERE " + where_string if where_string else "") +
+            " GROUP BY budget_line.line_index"
+        )
+        self.env.cr.execute(select, from_params + values_params + where_params)
+        practical_amounts = defaultdict(float)
+        for index, amount in self.env.cr.fetchall():
+            practical_amounts[windows[index][0]] += float(amount or 0.0)
+        return practical_amounts
 
     def _compute_theoritical_amount(self):
         # beware: 'today' variable is mocked in the python tests and thus, its implementation matter
@@ -229,9 +377,136 @@ class CrossoveredBudgetLines(models.Model):
             else:
                 line.percentage = 0.00
 
+    def _refresh_stored_amounts(self):
+        """ Copy the amounts computed for the lines to their stored fields, in one query. """
+        lines = self.exists()
+        if not lines:
+            return
+        amount_fields = ['practical_amount', 'theoritical_amount', 'percentage', 'is_above_budget']
+        lines.invalidate_recordset(amount_fields)
+        # computes the amounts of all the lines at once
+        lines.mapped('is_above_budget')
+        lines.mapped('percentage')
+        values = []
+        params = []
+        for line in lines:
+            values.append("(%s, %s::numeric, %s::numeric, %s::float8, %s::boolean)")
+            params += [line.id, line.practical_amount, line.theoritical_amount,
+                       line.percentage, line.is_above_budget]
+        lines.flush_recordset()
+        self.env.cr.execute("""
+            UPDATE crossovered_budget_lines line
+               SET stored_practical_amount = amounts.practical_amount,
+                   stored_theoritical_amount = amounts.theoritical_amount,
+                   stored_percentage = amounts.percentage,
+                   stored_is_above_budget = amounts.is_above_budget,
+                   amounts_refresh_date = %s
+              FROM (VALUES """ + ", ".join(values) + """)
+                   AS amounts(id, practical_amount, theoritical_amount, percentage, is_above_budget)
+             WHERE line.id = amounts.id
+        """, [fields.Datetime.now()] + params)
+        lines.invalidate_recordset([
+            'stored_practical_amount', 'stored_theoritical_amount', 'stored_percentage',
+            'stored_is_above_budget', 'amounts_refresh_date',
+        ])
+        consumed = self.env.cr.precommit.data.get(self._headroom_consumed_key)
+        if consumed:
+            for line in lines:
+                consumed.pop(line.id, None)
+
+    def _schedule_stored_amounts_refresh(self, actual_keys=None):
+        """ Refresh the stored amounts right before the transaction commits, for the lines of
+        ``self`` and for the lines covering the given ``(source, account_id, month)`` actuals. """
+        pending = self.env.cr.precommit.data.setdefault(
+            self._stored_amounts_refresh_key, {'line_ids': set(), 'actual_keys': set()})
+        if not pending['line_ids'] and not pending['actual_keys']:
+            budget_lines = self.sudo()
+
+            @self.env.cr.precommit.add
+            def _refresh_pending():
+                to_refresh = budget_lines.env.cr.precommit.data.pop(budget_lines._stored_amounts_refresh_key, None)
+                if to_refresh:
+                    lines = budget_lines.browse(to_refresh['line_ids'])
+                    lines |= budget_lines._get_lines_of_actuals(to_refresh['actual_keys'])
+                    lines._refresh_stored_amounts()
+
+        pending['line_ids'].update(self.ids)
+        pending['actual_keys'].update(actual_keys or ())
+
+    @api.model
+    def _get_lines_of_actuals(self, actual_keys):
+        """ Budget lines whose practical amount may include the given ``(source, account_id, month)`` actuals. """
+        if not actual_keys:
+            return self.browse()
+        months = [key[2] for key in actual_keys]
+        account_domain = [('general_budget_id.account_ids', 'in', list({key[1] for key in actual_keys if key[1]}))]
+        if any(key[0] == 'analytic' for key in actual_keys):
+            account_domain = OR([account_domain, [
+                ('general_budget_id', '=', False), ('analytic_account_id', '!=', False),
+            ]])
+        return self.search(AND([account_domain, [
+            ('crossovered_budget_state', '!=', 'cancel'),
+            ('date_from', '<=', fields.Date.end_of(max(months), 'month')),
+            ('date_to', '>=', min(months)),
+        ]]))
+
+    @api.model
+    def _cron_refresh_stored_amounts(self, batch_size=1000):
+        # the theoretical amounts depend on the current date: refresh all the open lines
+        lines = self.search([('crossovered_budget_state', '!=', 'cancel')])
+        for line_ids in split_every(batch_size, lines.ids):
+            self.browse(line_ids)._refresh_stored_amounts()
+
+    @api.model
+    def _get_budget_line_index(self, company_ids, date_from, date_to):
+        """ Cost lines of the running budgets of the companies overlapping the given dates, per
+        company and account of their budgetary position, the lines without budgetary position
+        being indexed under False.
+
+        :return: dictionary {company_id: {account_id: [(line_id, analytic_account_id, date_from, date_to), ...]}}
+        """
+        lines = self.sudo().search([
+            ('company_id', 'in', company_ids),
+            ('crossovered_budget_state', 'in', ('confirm', 'validate')),
+            ('planned_amount', '<', 0),
+            ('date_from', '<=', date_to),
+            ('date_to', '>=', date_from),
+        ])
+        index = defaultdict(lambda: defaultdict(list))
+        for line in lines:
+            entry = (line.id, line.analytic_account_id.id, line.date_from, line.date_to)
+            for account in line.general_budget_id.account_ids or [self.env['account.account']]:
+                index[line.company_id.id][account.id].append(entry)
+        return index
+
+    def _get_budget_headroom(self, practical_amounts):
+        """ Remaining amount of the cost budget lines once the given practical amounts are added.
+
+        The headroom starts from the stored practical amount of the lines, plus the amounts
+        already checked in the current transaction, which are not stored yet.
+
+        :param practical_amounts: dictionary {budget line id: practical amount to add}
+        :return: dictionary {budget line: headroom}, negative when the line is over plan
+        """
+        consumed = self.env.cr.precommit.data.setdefault(self._headroom_consumed_key, defaultdict(float))
+        headroom = {}
+        for line in self:
+            headroom[line] = (
+                line.stored_practical_amount + consumed[line.id]
+                + practical_amounts.get(line.id, 0.0) - line.planned_amount
+            )
+        return headroom
+
+    def _consume_budget_headroom(self, practical_amounts):
+        """ Keep the practical amounts checked in the current transaction until the stored
+        amounts are refreshed, right before commit. """
+        consumed = self.env.cr.precommit.data.setdefault(self._headroom_consumed_key, defaultdict(float))
+        for line_id, amount in practical_amounts.items():
+            consumed[line_id] += amount
+
     @api.constrains('general_budget_id', 'analytic_account_id')
     def _must_have_analytical_or_budgetary_or_both(self):
-        if not self.analytic_account_id and not self.general_budget_id:
+        if any(not line.analytic_account_id and not line.general_budget_id for line in self):
             raise ValidationError(
                 _("You have to enter at least a budgetary position or analytic account on a budget line."))
 
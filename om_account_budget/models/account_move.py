@@ -0,0 +1,184 @@
+from collections import defaultdict
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools.misc import format_amount
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    # the accounting date is computed from the invoice date
+    _budget_actual_fields = ('date', 'invoice_date')
+
+    def write(self, vals):
+        # the date of the journal items follows the date of the entry without
+        # going through their own write
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('move', self.line_ids, 'account_id')
+        res = super(AccountMove, self).write(vals)
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('move', self.line_ids, 'account_id')
+        return res
+
+    def _post(self, soft=True):
+        policy = self.env['ir.config_parameter'].sudo().get_param('om_account_budget.overspend_policy', 'none')
+        overspends = {}
+        if policy in ('warn', 'block'):
+            to_check = self.filtered(lambda move: move._is_budget_checked())
+            if soft:
+                # future entries are not posted yet
+                today = fields.Date.context_today(self)
+                to_check = to_check.filtered(lambda move: move.date <= today)
+            overspends = to_check._check_budget_overspend(block=policy == 'block')
+        posted = super(AccountMove, self)._post(soft)
+        for move, move_overspends in overspends.items():
+            if move in posted:
+                move.message_post(body=_(
+                    "This entry exceeds the following budgets: %s",
+                    self._format_budget_overspends(move_overspends),
+                ))
+        return posted
+
+    def _is_budget_checked(self):
+        """ Whether the budgets are checked when posting the entry: vendor bills, receipts and expenses. """
+        self.ensure_one()
+        return self.is_purchase_document(include_receipts=True) or bool(
+            'expense_sheet_id' in self._fields and self.expense_sheet_id)
+
+    def _get_budget_consumption(self):
+        """ Practical amounts the journal items of the moves add to the cost lines of the running budgets.
+
+        The budget lines are matched on (account, analytic account, date) through an index of
+        the running budgets built once for all the moves, without computing their practical
+        amount. The journal items written before the last refresh of the stored amounts of a
+        budget line are already part of them, except for the analytic budget lines: their
+        analytic items are only created when posting.
+
+        :return: tuple of dictionaries ({budget line: {move: practical amount}},
+            {budget line id: part of the practical amount already in the stored amount})
+        """
+        BudgetLine = self.env['crossovered.budget.lines'].sudo()
+        dates = self.line_ids.filtered('date').mapped('date')
+        if not dates:
+            return {}, {}
+        index = BudgetLine._get_budget_line_index(self.company_id.ids, min(dates), max(dates))
+        matches = []
+        for move in self:
+            company_index = index.get(move.company_id.id)
+            if not company_index:
+                continue
+            for line in move.line_ids:
+                candidates = company_index.get(line.account_id.id, []) + company_index.get(False, [])
+                if not candidates:
+                    continue
+                analytic_shares = None
+                for budget_line_id, analytic_account_id, date_from, date_to in candidates:
+                    if not date_from <= line.date <= date_to:
+                        continue
+                    share = 1.0
+                    if analytic_account_id:
+                        if analytic_shares is None:
+                            analytic_shares = line._get_budget_analytic_shares()
+                        share = analytic_shares.get(analytic_account_id)
+                        if not share:
+                            continue
+                    matches.append((budget_line_id, analytic_account_id, line, -line.balance * share))
+        if not matches:
+            return {}, {}
+
+        budget_lines = BudgetLine.browse({match[0] for match in matches})
+        budget_lines.filtered(lambda budget_line: not budget_line.amounts_refresh_date)._refresh_stored_amounts()
+        consumption = defaultdict(lambda: defaultdict(float))
+        stored_amounts = defaultdict(float)
+        for budget_line_id, analytic_account_id, line, amount in matches:
+            budget_line = BudgetLine.browse(budget_line_id)
+            consumption[budget_line][line.move_id] += amount
+            if not analytic_account_id and line.write_date and line.write_date <= budget_line.amounts_refresh_date:
+                stored_amounts[budget_line_id] += amount
+        return consumption, stored_amounts
+
+    def _check_budget_overspend(self, block=False):
+        """ Check the headroom of the budget lines the moves are booked on.
+
+        The headroom is checked against the stored amounts plus the part of the moves they
+        do not include yet, for all the budget lines the moves cost something to.
+
+        :param block: raise if a budget line would be over plan
+        :return: dictionary {move: {budget line: amount over plan}}
+        """
+        consumption, stored_amounts = self._get_budget_consumption()
+        if not consumption:
+            return {}
+        booked_amounts = {budget_line.id: sum(amounts.values()) for budget_line, amounts in consumption.items()}
+        practical_amounts = {
+            budget_line_id: amount - stored_amounts.get(budget_line_id, 0.0)
+            for budget_line_id, amount in booked_amounts.items()
+        }
+        budget_lines = self.env['crossovered.budget.lines'].sudo().browse(practical_amounts)
+        overspent = {
+            budget_line: -headroom
+            for budget_line, headroom in budget_lines._get_budget_headroom(practical_amounts).items()
+            if booked_amounts[budget_line.id] < 0 and budget_line.currency_id.compare_amounts(headroom, 0) < 0
+        }
+        if overspent and block:
+            raise UserError(_(
+                "These entries cannot be posted, they exceed the following budgets: %s",
+                self._format_budget_overspends(overspent),
+            ))
+        budget_lines._consume_budget_headroom(practical_amounts)
+        overspends = defaultdict(dict)
+        for budget_line, amount in overspent.items():
+            for move in consumption[budget_line]:
+                overspends[move][budget_line] = amount
+        return overspends
+
+    @api.model
+    def _format_budget_overspends(self, overspends):
+        return ", ".join(
+            _("%(budget_line)s (%(amount)s over plan)",
+              budget_line=budget_line.name,
+              amount=format_amount(self.env, amount, budget_line.currency_id))
+            for budget_line, amount in overspends.items()
+        )
+
+
+class AccountMoveLine(models.Model):
+    _inherit = "account.move.line"
+
+    # account, date and amounts of the items, and the fields they are computed from: the
+    # computed fields are stored when flushed, without going through write()
+    _budget_actual_fields = (
+        'account_id', 'date', 'debit', 'credit', 'balance', 'amount_currency', 'company_id',
+        'price_unit', 'quantity', 'discount', 'tax_ids', 'product_id', 'currency_id', 'move_id',
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountMoveLine, self).create(vals_list)
+        self.env['crossovered.budget.actual']._schedule_refresh('move', lines, 'account_id')
+        return lines
+
+    def write(self, vals):
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('move', self, 'account_id')
+        res = super(AccountMoveLine, self).write(vals)
+        if any(field_name in vals for field_name in self._budget_actual_fields):
+            self.env['crossovered.budget.actual']._schedule_refresh('move', self, 'account_id')
+        return res
+
+    def unlink(self):
+        self.env['crossovered.budget.actual']._schedule_refresh('move', self, 'account_id')
+        return super(AccountMoveLine, self).unlink()
+
+    def _get_budget_analytic_shares(self):
+        """ Share of the item booked on every analytic account of its distribution.
+
+        :return: dictionary {analytic_account_id: share between 0 and 1}
+        """
+        self.ensure_one()
+        shares = defaultdict(float)
+        for key, percentage in (self.analytic_distribution or {}).items():
+            for analytic_account_id in key.split(','):
+                shares[int(analytic_account_id)] += percentage / 100.0
+        return shares
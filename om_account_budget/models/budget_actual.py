@@ -0,0 +1,180 @@
+from odoo import api, fields, models, tools
+
+
+class CrossoveredBudgetActual(models.Model):
+    _name = "crossovered.budget.actual"
+    _description = "Budget Actuals per Account and Month"
+    _auto = False
+    _order = "month, account_id"
+
+    source = fields.Selection(
+        [('move', 'Journal Items'), ('analytic', 'Analytic Items')],
+        string='Source', readonly=True)
+    company_id = fields.Many2one('res.company', 'Company', readonly=True)
+    account_id = fields.Many2one('account.account', 'Account', readonly=True)
+    analytic_account_id = fields.Many2one('account.analytic.account', 'Analytic Account', readonly=True)
+    month = fields.Date('Month', readonly=True)
+    amount = fields.Float('Amount', readonly=True)
+
+    _refresh_key = 'crossovered.budget.actual.refresh'
+
+    # columns of the unique index of the rows, the missing accounts being 0
+    _key_columns = ("source, COALESCE(company_id, 0), COALESCE(account_id, 0), "
+                    "COALESCE(analytic_account_id, 0), month")
+
+    # source: (table, general account column, analytic account column, amount expression)
+    _sources = {
+        'move': ('account_move_line', 'account_id', 'NULL::integer', 'SUM(credit) - SUM(debit)'),
+        'analytic': ('account_analytic_line', 'general_account_id', 'account_id', 'SUM(amount)'),
+    }
+
+    def init(self):
+        # (company, account, analytic account, month) -> amount, kept up to date from the
+        # journal and analytic items so that budgets do not re-aggregate the whole ledger
+        self._cr.execute("""
+            CREATE TABLE IF NOT EXISTS crossovered_budget_actual (
+                id serial PRIMARY KEY,
+                source varchar NOT NULL,
+                company_id integer,
+                account_id integer,
+                analytic_account_id integer,
+                month date NOT NULL,
+                amount numeric NOT NULL DEFAULT 0
+            )""")
+        # one row per key: concurrent refreshes of the same key update the same row
+        # instead of inserting it twice
+        if not tools.index_exists(self._cr, 'crossovered_budget_actual_key_index'):
+            # the rows are rebuilt below, drop the duplicates the index would reject
+            self._cr.execute("TRUNCATE crossovered_budget_actual")
+        self._cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS crossovered_budget_actual_key_index
+                ON crossovered_budget_actual (""" + self._key_columns + """)
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS crossovered_budget_actual_source_account_month_index
+                ON crossovered_budget_actual (source, account_id, month)
+        """)
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS crossovered_budget_actual_analytic_month_index
+                ON crossovered_budget_actual (analytic_account_id, month)
+                WHERE analytic_account_id IS NOT NULL
+        """)
+        self._refresh()
+
+    def _refresh(self, keys=None, company_ids=None):
+        """ Rebuild the actuals of the given ``(source, account_id, month)`` keys and companies, or
+        all of them if None.
+
+        The rows are upserted and the rows of the keys without items left are deleted, in
+        one statement per source; the rows of a key are never deleted and inserted again.
+        The items are filtered on their accounts and on the range of months of the keys, so
+        that the indexes of the items are used: the other months of these accounts in the
+        range are rebuilt too.
+        """
+        if (keys is not None and not keys) or (company_ids is not None and not company_ids):
+            return
+        self.env['account.move.line'].flush_model()
+        self.env['account.analytic.line'].flush_model()
+        for source, (table, account_column, analytic_column, amount_select) in self._sources.items():
+            params = {'source': source}
+            key_filters = []
+            actual_filters = []
+            if keys is not None:
+                source_keys = [key for key in keys if key[0] == source]
+                if not source_keys:
+                    continue
+                months = [key[2] for key in source_keys]
+                params['account_ids'] = list({key[1] for key in source_keys if key[1]})
+                params['date_from'] = min(months)
+                params['date_to'] = fields.Date.add(max(months), months=1)
+                # the items without account are matched on their own, "= ANY" skips NULL
+                account_filter = []
+                actual_account_filter = []
+                if params['account_ids']:
+                    account_filter.append(account_column + " = ANY(%(account_ids)s)")
+                    actual_account_filter.append("c.account_id = ANY(%(account_ids)s)")
+                if any(not key[1] for key in source_keys):
+                    account_filter.append(account_column + " IS NULL")
+                    actual_account_filter.append("c.account_id IS NULL")
+                key_filters += [
+                    "(" + " OR ".join(account_filter) + ")",
+                    "date >= %(date_from)s", "date < %(date_to)s",
+                ]
+                actual_filters += [
+                    "(" + " OR ".join(actual_account_filter) + ")",
+                    "c.month >= %(date_from)s", "c.month < %(date_to)s",
+                ]
+            if company_ids is not None:
+                params['company_ids'] = list(company_ids)
+                key_filters.append("company_id = ANY(%(company_ids)s)")
+                actual_filters.append("c.company_id = ANY(%(company_ids)s)")
+            key_filter = "WHERE " + " AND ".join(key_filters) if key_filters else ""
+            actual_filter = "".join("AND " + actual_filter + " " for actual_filter in actual_filters)
+            self._cr.execute("""
+                WITH actual AS (
+                    SELECT %(source)s::varchar AS source, company_id, """ + account_column + """ AS account_id,
+                           """ + analytic_column + """ AS analytic_account_id,
+                           date_trunc('month', date)::date AS month, """ + amount_select + """ AS amount
+                      FROM """ + table + """
+                    """ + key_filter + """
+                  GROUP BY company_id, """ + account_column + ", " + analytic_column + """, date_trunc('month', date)
+                ), deleted AS (
+                    DELETE FROM crossovered_budget_actual c
+                     WHERE c.source = %(source)s
+                       """ + actual_filter + """
+                       AND NOT EXISTS (
+                            SELECT 1 FROM actual
+                             WHERE actual.month = c.month
+                               AND actual.company_id IS NOT DISTINCT FROM c.company_id
+                               AND actual.account_id IS NOT DISTINCT FROM c.account_id
+                               AND actual.analytic_account_id IS NOT DISTINCT FROM c.analytic_account_id)
+                )
+                INSERT INTO crossovered_budget_actual (source, company_id, account_id, analytic_account_id, month, amount)
+                SELECT source, company_id, account_id, analytic_account_id, month, amount
+                  FROM actual
+                ON CONFLICT (""" + self._key_columns + """) DO UPDATE
+                   SET amount = EXCLUDED.amount
+            """, params)
+        self.invalidate_model()
+
+    @api.model
+    def _schedule_refresh(self, source, records, account_field):
+        """ Mark the months of ``records`` to be refreshed before the transaction commits.
+        Until then, the budget lines read the items of these months instead of their actuals. """
+        keys = {
+            (source, record[account_field].id, fields.Date.start_of(record.date, 'month'))
+            for record in records if record.date
+        }
+        if not keys:
+            return
+        pending = self.env.cr.precommit.data.setdefault(self._refresh_key, set())
+        if not pending:
+            actuals = self.sudo()
+            self.env.cr.precommit.add(actuals._refresh_pending)
+        pending.update(keys)
+        self.env['crossovered.budget.lines']._schedule_stored_amounts_refresh(keys)
+
+    def _refresh_pending(self):
+        keys = self.env.cr.precommit.data.pop(self._refresh_key, set())
+        if keys:
+            # the companies without budget line get their actuals rebuilt with their first one
+            self.sudo()._refresh(keys, self._get_budget_company_ids())
+
+    @api.model
+    def _get_budget_company_ids(self):
+        """ Companies with budget lines, the only ones whose actuals are kept up to date. """
+        self.env['crossovered.budget.lines'].flush_model(['company_id'])
+        self._cr.execute("SELECT DISTINCT company_id FROM crossovered_budget_lines WHERE company_id IS NOT NULL")
+        return [company_id for company_id, in self._cr.fetchall()]
+
+    @api.model
+    def _get_pending_keys(self):
+        """ ``(source, account_id, month)`` keys changed in the transaction, whose actuals are
+        only refreshed when it commits. """
+        return self.env.cr.precommit.data.get(self._refresh_key, set())
+
+    @api.model
+    def action_rebuild(self):
+        self.sudo()._refresh()
+        self.env['crossovered.budget.lines'].sudo()._cron_refresh_stored_amounts()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
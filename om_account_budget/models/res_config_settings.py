@@ -0,0 +1,13 @@
+from odoo import fields, models
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    budget_overspend_policy = fields.Selection(
+        [('none', 'No Check'), ('warn', 'Warn'), ('block', 'Block')],
+        string='Budget Overspending', default='none',
+        config_parameter='om_account_budget.overspend_policy',
+        help="Check the running budgets when vendor bills, receipts and expenses are posted.\n"
+             "Warn: the entry is posted and a note lists the budgets it exceeds.\n"
+             "Block: the entry cannot be posted.")
@@ -0,0 +1,64 @@
+from odoo import fields, models, tools
+
+
+class BudgetVarianceReport(models.Model):
+    _name = "crossovered.budget.variance.report"
+    _description = "Budget vs Actual Variance"
+    _auto = False
+    _order = "date_from, budget_id"
+
+    budget_id = fields.Many2one('crossovered.budget', 'Budget', readonly=True)
+    general_budget_id = fields.Many2one('account.budget.post', 'Budgetary Position', readonly=True)
+    analytic_account_id = fields.Many2one('account.analytic.account', 'Analytic Account', readonly=True)
+    company_id = fields.Many2one('res.company', 'Company', readonly=True)
+    date_from = fields.Date('Start Date', readonly=True)
+    date_to = fields.Date('End Date', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('cancel', 'Cancelled'),
+        ('confirm', 'Confirmed'),
+        ('validate', 'Validated'),
+        ('done', 'Done')
+        ], 'Budget State', readonly=True)
+    planned_amount = fields.Float('Planned Amount', readonly=True)
+    actual_amount = fields.Float('Actual Amount', readonly=True)
+    variance = fields.Float('Variance', readonly=True, help="Actual amount minus planned amount.")
+
+    def init(self):
+        # actuals are read per month from crossovered_budget_actual: a budget line
+        # counts the whole months overlapping its period
+        tools.drop_view_if_exists(self._cr, 'crossovered_budget_variance_report')
+        self._cr.execute("""
+            CREATE OR REPLACE VIEW crossovered_budget_variance_report AS (
+                SELECT bl.id AS id,
+                       bl.crossovered_budget_id AS budget_id,
+                       bl.general_budget_id AS general_budget_id,
+                       bl.analytic_account_id AS analytic_account_id,
+                       bl.company_id AS company_id,
+                       bl.date_from AS date_from,
+                       bl.date_to AS date_to,
+                       bl.crossovered_budget_state AS state,
+                       bl.planned_amount AS planned_amount,
+                       COALESCE(actual.amount, 0) AS actual_amount,
+                       COALESCE(actual.amount, 0) - bl.planned_amount AS variance
+                  FROM crossovered_budget_lines bl
+             LEFT JOIN LATERAL (
+                    SELECT SUM(a.amount) AS amount
+                      FROM crossovered_budget_actual a
+                     WHERE a.company_id = bl.company_id
+                       AND a.month BETWEEN date_trunc('month', bl.date_from)::date AND bl.date_to
+                       AND (
+                            (bl.analytic_account_id IS NOT NULL
+                             AND a.source = 'analytic'
+                             AND a.analytic_account_id = bl.analytic_account_id
+                             AND (bl.general_budget_id IS NULL OR a.account_id IN (
+                                  SELECT rel.account_id FROM account_budget_rel rel
+                                   WHERE rel.budget_id = bl.general_budget_id)))
+                         OR (bl.analytic_account_id IS NULL
+                             AND a.source = 'move'
+                             AND a.account_id IN (
+                                  SELECT rel.account_id FROM account_budget_rel rel
+                                   WHERE rel.budget_id = bl.general_budget_id))
+                       )
+                ) actual ON TRUE
+            )""")
@@ -0,0 +1,151 @@
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, Command, _
+from odoo.exceptions import UserError
+
+
+class CrossoveredBudgetLineGenerator(models.TransientModel):
+    _name = 'crossovered.budget.line.generator'
+    _description = 'Generate Budget Lines'
+
+    budget_id = fields.Many2one('crossovered.budget', 'Budget', required=True, ondelete='cascade')
+    company_id = fields.Many2one(related='budget_id.company_id')
+    currency_id = fields.Many2one(related='budget_id.company_id.currency_id')
+    general_budget_ids = fields.Many2many('account.budget.post', string='Budgetary Positions')
+    analytic_account_ids = fields.Many2many('account.analytic.account', string='Analytic Accounts')
+    date_from = fields.Date('Start Date', required=True, compute='_compute_dates', store=True, readonly=False)
+    date_to = fields.Date('End Date', required=True, compute='_compute_dates', store=True, readonly=False)
+    periodicity = fields.Selection(
+        [('month', 'Monthly'), ('quarter', 'Quarterly')],
+        string='Periodicity', required=True, default='month')
+    phasing = fields.Selection(
+        [('even', 'Even'), ('curve', 'Custom Curve')],
+        string='Phasing', required=True, default='even',
+        help="Even: the planned amount is split equally between the periods.\n"
+             "Custom Curve: the planned amount is split according to the weight of every period.")
+    planned_amount = fields.Monetary(
+        'Planned Amount', required=True,
+        help="Amount planned for the whole period, for every budgetary position and analytic account. "
+             "Record a positive amount if it is a revenue and a negative amount if it is a cost.")
+    phase_ids = fields.One2many(
+        'crossovered.budget.line.generator.phase', 'generator_id', string='Periods',
+        compute='_compute_phase_ids', store=True, readonly=False)
+    line_count = fields.Integer('Lines to Create', compute='_compute_line_count')
+
+    @api.depends('budget_id')
+    def _compute_dates(self):
+        for wizard in self:
+            wizard.date_from = wizard.budget_id.date_from
+            wizard.date_to = wizard.budget_id.date_to
+
+    @api.depends('date_from', 'date_to', 'periodicity')
+    def _compute_phase_ids(self):
+        for wizard in self:
+            commands = [Command.clear()]
+            for date_from, date_to in wizard._get_periods():
+                commands.append(Command.create({'date_from': date_from, 'date_to': date_to, 'weight': 1.0}))
+            wizard.phase_ids = commands
+
+    @api.depends('general_budget_ids', 'analytic_account_ids', 'phase_ids')
+    def _compute_line_count(self):
+        for wizard in self:
+            if not wizard.general_budget_ids and not wizard.analytic_account_ids:
+                wizard.line_count = 0
+                continue
+            wizard.line_count = (
+                max(len(wizard.general_budget_ids), 1)
+                * max(len(wizard.analytic_account_ids), 1)
+                * len(wizard.phase_ids)
+            )
+
+    def _get_periods(self):
+        """ Consecutive periods of the given periodicity covering the dates of the wizard,
+        the last one being shortened to end with them.
+
+        Every period is offset from the start date, so that periods starting at the end
+        of a month keep their day instead of drifting after February.
+
+        :return: list of ``(date_from, date_to)``
+        """
+        self.ensure_one()
+        if not self.date_from or not self.date_to or self.date_from > self.date_to:
+            return []
+        months = 3 if self.periodicity == 'quarter' else 1
+        periods = []
+        date_from = self.date_from
+        while date_from <= self.date_to:
+            next_date = self.date_from + relativedelta(months=(len(periods) + 1) * months)
+            periods.append((date_from, min(next_date - relativedelta(days=1), self.date_to)))
+            date_from = next_date
+        return periods
+
+    def _get_period_amounts(self):
+        """ Split the planned amount between the periods, the rounding difference
+        being added to the last one.
+
+        :return: list of ``(date_from, date_to, amount)``
+        """
+        self.ensure_one()
+        phases = self.phase_ids.sorted('date_from')
+        if self.phasing == 'curve':
+            weights = phases.mapped('weight')
+        else:
+            weights = [1.0] * len(phases)
+        total_weight = sum(weights)
+        if total_weight <= 0:
+            raise UserError(_('The weights of the periods must add up to a positive value.'))
+        period_amounts = []
+        remaining = self.planned_amount
+        for phase, weight in zip(phases, weights):
+            if phase == phases[-1]:
+                amount = remaining
+            else:
+                amount = self.currency_id.round(self.planned_amount * weight / total_weight)
+            remaining -= amount
+            period_amounts.append((phase.date_from, phase.date_to, amount))
+        return period_amounts
+
+    def _prepare_budget_lines_vals(self):
+        self.ensure_one()
+        vals_list = []
+        period_amounts = self._get_period_amounts()
+        for general_budget in self.general_budget_ids or [self.env['account.budget.post']]:
+            for analytic_account in self.analytic_account_ids or [self.env['account.analytic.account']]:
+                for date_from, date_to, amount in period_amounts:
+                    vals_list.append({
+                        'crossovered_budget_id': self.budget_id.id,
+                        'general_budget_id': general_budget.id,
+                        'analytic_account_id': analytic_account.id,
+                        'date_from': date_from,
+                        'date_to': date_to,
+                        'planned_amount': amount,
+                    })
+        return vals_list
+
+    def action_generate(self):
+        self.ensure_one()
+        budget = self.budget_id
+        if budget.state != 'draft':
+            raise UserError(_('Budget lines can only be generated on a draft budget.'))
+        if not self.general_budget_ids and not self.analytic_account_ids:
+            raise UserError(_('You have to select at least a budgetary position or an analytic account.'))
+        if not self.phase_ids:
+            raise UserError(_('There is no period between the start and the end date.'))
+        if self.date_from < budget.date_from or self.date_to > budget.date_to:
+            raise UserError(_('The generated lines should be included in the Period of the budget.'))
+        if any(phase.date_from < self.date_from or phase.date_to > self.date_to or phase.date_from > phase.date_to
+               for phase in self.phase_ids):
+            raise UserError(_('The periods should be included between the start and the end date.'))
+        self.env['crossovered.budget.lines'].create(self._prepare_budget_lines_vals())
+        return {'type': 'ir.actions.act_window_close'}
+
+
+class CrossoveredBudgetLineGeneratorPhase(models.TransientModel):
+    _name = 'crossovered.budget.line.generator.phase'
+    _description = 'Generate Budget Lines: Period'
+    _order = 'date_from'
+
+    generator_id = fields.Many2one('crossovered.budget.line.generator', required=True, ondelete='cascade')
+    date_from = fields.Date('Start Date', required=True)
+    date_to = fields.Date('End Date', required=True)
+    weight = fields.Float('Weight', default=1.0, digits=(16, 4))
@@ -0,0 +1,11 @@
+def get_currency_symbols(env, currency_ids):
+    """
+    Load the symbols of the given currencies in a single read.
+
+    Returns a dictionary {currency_id: symbol}
+    """
+    currency_ids = [currency_id for currency_id in set(currency_ids) if currency_id]
+    if not currency_ids:
+        return {}
+    currencies = env['res.currency'].browse(currency_ids)
+    return {rec['id']: rec['symbol'] for rec in currencies.read(['symbol'])}
@@ -2,6 +2,8 @@ import time
 from odoo import api, models, _
 from odoo.exceptions import UserError
 
+from .currency_symbols import get_currency_symbols
+
 
 class ReportBankBook(models.AbstractModel):
     _name = 'report.om_account_daily_reports.report_bankbook'
@@ -22,13 +24,18 @@ class ReportBankBook(models.AbstractModel):
                 'debit': sum of total debit amount,
                 'credit': sum of total credit amount,
                 'balance': total balance,
-                'amount_currency': sum of amount_currency,
+                'amount_currency': sum of amount_currency of the items in a foreign currency,
+                'currency_totals': list of subtotals per foreign currency,
                 'move_lines': list of move lines
             }
         """
         cr = self.env.cr
         MoveLine = self.env['account.move.line']
         move_lines = {x: [] for x in accounts.ids}
+        # Opening balance per account in company currency, and per
+        # (account, currency) in foreign currency
+        init_balances = {}
+        init_currency_balances = {}
 
         # Prepare initial SQL query and get the initial move lines
         if init_balance:
@@ -45,29 +52,36 @@ class ReportBankBook(models.AbstractModel):
             filters = init_filters.replace('account_move_line__move_id', 'm').replace('account_move_line', 'l')
 
             sql = ("""
-                SELECT 0 AS lid, 
-                       l.account_id AS account_id, 
-                       '' AS ldate, '' AS lcode, 0.0 AS amount_currency, 
-                       '' AS lref, 'Initial Balance' AS lname, 
+                SELECT l.account_id AS account_id,
+                       l.currency_id AS currency_id,
                        COALESCE(SUM(l.credit), 0.0) AS credit,
                        COALESCE(SUM(l.debit), 0.0) AS debit,
-                       COALESCE(SUM(l.debit), 0) - COALESCE(SUM(l.credit), 0) AS balance, 
-                       '' AS lpartner_id, '' AS move_name, '' AS currency_code, 
-                       NULL AS currency_id, '' AS partner_name,
-                       '' AS mmove_id, '' AS invoice_id, '' AS invoice_type, '' AS invoice_number
-                FROM account_move_line l 
-                LEFT JOIN account_move m ON (l.move_id = m.id) 
-                LEFT JOIN res_currency c ON (l.currency_id = c.id) 
-                LEFT JOIN res_partner p ON (l.partner_id = p.id) 
-                JOIN account_journal j ON (l.journal_id = j.id) 
-                JOIN account_account acc ON (l.account_id = acc.id) 
-                WHERE l.account_id IN %s """ + filters + 'GROUP BY l.account_id'
+                       COALESCE(SUM(l.amount_currency), 0.0) AS amount_currency
+                FROM account_move_line l
+                LEFT JOIN account_move m ON (l.move_id = m.id)
+                LEFT JOIN res_partner p ON (l.partner_id = p.id)
+                JOIN account_journal j ON (l.journal_id = j.id)
+                JOIN account_account acc ON (l.account_id = acc.id)
+                WHERE l.account_id IN %s """ + filters + ' GROUP BY l.account_id, l.currency_id'
                    )
 
             params = (tuple(accounts.ids),) + tuple(init_where_params)
             cr.execute(sql, params)
             for row in cr.dictfetchall():
-                move_lines[row.pop('account_id')].append(row)
+                init = init_balances.setdefault(row['account_id'], {'debit': 0.0, 'credit': 0.0})
+                init['debit'] += row['debit']
+                init['credit'] += row['credit']
+                if row['currency_id']:
+                    init_currency_balances[(row['account_id'], row['currency_id'])] = row['amount_currency']
+
+            for account_id, init in init_balances.items():
+                move_lines.setdefault(account_id, []).append({
+                    'lid': 0, 'ldate': '', 'lcode': '', 'amount_currency': 0.0, 'lref': '',
+                    'lname': 'Initial Balance', 'credit': init['credit'], 'debit': init['debit'],
+                    'balance': init['debit'] - init['credit'], 'lpartner_id': '', 'move_name': '',
+                    'currency_code': '', 'currency_id': None, 'currency_balance': 0.0, 'partner_name': '',
+                    'mmove_id': '', 'invoice_id': '', 'invoice_type': '', 'invoice_number': '',
+                })
 
         sql_sort = 'l.date, l.move_id'
         if sortby == 'sort_journal_partner':
@@ -91,45 +105,81 @@ class ReportBankBook(models.AbstractModel):
                     if acc_in.payment_account_id:
                         accounts += acc_in.payment_account_id
 
+        # Running balances are computed by window functions in the same pass:
+        # per account in company currency and per (account, currency) in
+        # foreign currency, in the order the lines are printed.
+        window_order = sql_sort + ', l.id'
         sql = ('''
-            SELECT l.id AS lid, l.account_id AS account_id, l.date AS ldate, j.code AS lcode, 
-                   l.currency_id, l.amount_currency, l.ref AS lref, l.name AS lname, 
-                   COALESCE(l.debit, 0) AS debit, COALESCE(l.credit, 0) AS credit, 
-                   COALESCE(SUM(l.debit), 0) - COALESCE(SUM(l.credit), 0) AS balance,
-                   m.name AS move_name, c.symbol AS currency_code, p.name AS partner_name
+            SELECT l.id AS lid, l.account_id AS account_id, l.date AS ldate, j.code AS lcode,
+                   l.currency_id, l.amount_currency, l.ref AS lref, l.name AS lname,
+                   COALESCE(l.debit, 0) AS debit, COALESCE(l.credit, 0) AS credit,
+                   SUM(COALESCE(l.debit, 0) - COALESCE(l.credit, 0)) OVER (
+                       PARTITION BY l.account_id ORDER BY ''' + window_order + '''
+                   ) AS balance,
+                   SUM(COALESCE(l.amount_currency, 0)) OVER (
+                       PARTITION BY l.account_id, l.currency_id ORDER BY ''' + window_order + '''
+                   ) AS currency_balance,
+                   m.name AS move_name, p.name AS partner_name
             FROM account_move_line l
             JOIN account_move m ON (l.move_id = m.id)
-            LEFT JOIN res_currency c ON (l.currency_id = c.id)
             LEFT JOIN res_partner p ON (l.partner_id = p.id)
             JOIN account_journal j ON (l.journal_id = j.id)
             JOIN account_account acc ON (l.account_id = acc.id)
-            WHERE l.account_id IN %s ''' + filters + ''' 
-            GROUP BY l.id, l.account_id, l.date, j.code, l.currency_id, l.amount_currency, 
-                     l.ref, l.name, m.name, c.symbol, p.name 
-            ORDER BY ''' + sql_sort
+            WHERE l.account_id IN %s ''' + filters + '''
+            ORDER BY ''' + window_order
                )
 
         params = (tuple(accounts.ids),) + tuple(where_params)
         cr.execute(sql, params)
+        rows = cr.dictfetchall()
+
+        currency_symbols = get_currency_symbols(
+            self.env, [row['currency_id'] for row in rows] + [key[1] for key in init_currency_balances]
+        )
 
-        for row in cr.dictfetchall():
-            balance = 0
-            for line in move_lines.get(row['account_id']):
-                balance += line['debit'] - line['credit']
-            row['balance'] += balance
-            move_lines[row.pop('account_id')].append(row)
+        for row in rows:
+            account_id = row.pop('account_id')
+            init = init_balances.get(account_id)
+            if init:
+                row['balance'] += init['debit'] - init['credit']
+            row['currency_balance'] += init_currency_balances.get((account_id, row['currency_id']), 0.0)
+            row['currency_code'] = currency_symbols.get(row['currency_id'], '')
+            move_lines.setdefault(account_id, []).append(row)
 
         # Calculate the debit, credit and balance for accounts
         account_res = []
         for account in accounts:
             currency = account.currency_id or self.env.company.currency_id
-            res = {fn: 0.0 for fn in ['credit', 'debit', 'balance']}
-            res.update({'code': account.code, 'name': account.name, 'move_lines': move_lines[account.id]})
+            res = {fn: 0.0 for fn in ['credit', 'debit', 'balance', 'amount_currency']}
+            res.update({'code': account.code, 'name': account.name, 'move_lines': move_lines.get(account.id, [])})
+
+            # the items in the company currency are already summed in the account totals
+            company_currency_id = self.env.company.currency_id.id
+            currency_totals = {}
+            for (account_id, currency_id), amount in init_currency_balances.items():
+                if account_id == account.id and currency_id != company_currency_id:
+                    currency_totals[currency_id] = {
+                        'currency_id': currency_id,
+                        'currency_code': currency_symbols[currency_id],
+                        'debit': 0.0, 'credit': 0.0, 'amount_currency': 0.0, 'balance': amount,
+                    }
 
             for line in res.get('move_lines'):
                 res['debit'] += line['debit']
                 res['credit'] += line['credit']
                 res['balance'] = line['balance']
+                if line['currency_id'] and line['currency_id'] != company_currency_id:
+                    total = currency_totals.setdefault(line['currency_id'], {
+                        'currency_id': line['currency_id'],
+                        'currency_code': line['currency_code'],
+                        'debit': 0.0, 'credit': 0.0, 'amount_currency': 0.0, 'balance': 0.0,
+                    })
+                    total['debit'] += line['debit']
+                    total['credit'] += line['credit']
+                    total['amount_currency'] += line['amount_currency'] or 0.0
+                    total['balance'] = line['currency_balance']
+                    res['amount_currency'] += line['amount_currency'] or 0.0
+            res['currency_totals'] = list(currency_totals.values())
 
             if display_account == 'all':
                 account_res.append(res)
@@ -14,6 +14,7 @@
         'data/data.xml',
         'wizard/followup_print_view.xml',
         'wizard/followup_results_view.xml',
+        'wizard/followup_forecast_view.xml',
         'views/followup_view.xml',
         'views/account_move.xml',
         'views/partners.xml',
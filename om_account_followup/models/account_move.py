@@ -1,6 +1,20 @@
 from odoo import api, fields, models, _
 
 
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def write(self, vals):
+        # the partner and date of the journal items follow the entry without
+        # going through their own write
+        if 'partner_id' in vals or 'date' in vals:
+            self.env['followup.stat.by.partner']._schedule_refresh(self.line_ids)
+        res = super(AccountMove, self).write(vals)
+        if 'partner_id' in vals or 'date' in vals:
+            self.env['followup.stat.by.partner']._schedule_refresh(self.line_ids)
+        return res
+
+
 class AccountMoveLine(models.Model):
     _inherit = 'account.move.line'
 
@@ -8,6 +22,42 @@ class AccountMoveLine(models.Model):
     followup_date = fields.Date('Latest Follow-up')
     result = fields.Float(compute='_get_result', string="Balance Amount")
 
+    _followup_stat_fields = ('partner_id', 'account_id', 'company_id', 'full_reconcile_id', 'debit', 'credit',
+                             'balance', 'date', 'followup_line_id', 'followup_date')
+
     def _get_result(self):
         for aml in self:
             aml.result = aml.debit - aml.credit
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountMoveLine, self).create(vals_list)
+        self.env['followup.stat.by.partner']._schedule_refresh(lines)
+        return lines
+
+    def write(self, vals):
+        if any(field_name in vals for field_name in self._followup_stat_fields):
+            self.env['followup.stat.by.partner']._schedule_refresh(self)
+        res = super(AccountMoveLine, self).write(vals)
+        if any(field_name in vals for field_name in self._followup_stat_fields):
+            self.env['followup.stat.by.partner']._schedule_refresh(self)
+        return res
+
+    def unlink(self):
+        self.env['followup.stat.by.partner']._schedule_refresh(self)
+        return super(AccountMoveLine, self).unlink()
+
+
+class AccountFullReconcile(models.Model):
+    _inherit = 'account.full.reconcile'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        full_reconciles = super(AccountFullReconcile, self).create(vals_list)
+        self.env['followup.stat.by.partner']._schedule_refresh(full_reconciles.reconciled_line_ids)
+        return full_reconciles
+
+    def unlink(self):
+        # the reconciled items are released by the database (ondelete set null)
+        self.env['followup.stat.by.partner']._schedule_refresh(self.reconciled_line_ids)
+        return super(AccountFullReconcile, self).unlink()
@@ -22,13 +22,57 @@ class FollowupStatByPartner(models.Model):
     company_id = fields.Many2one('res.company', 'Company', readonly=True)
     invoice_partner_id = fields.Many2one('res.partner', compute='_get_invoice_partner_id', string='Invoice Address')
 
+    _refresh_key = 'followup.stat.by.partner.refresh'
+
     @api.model
     def init(self):
+        # The statistics used to be a view re-aggregating all the open receivable
+        # items on every read, with ids made of partner_id * 10000 + company_id.
+        # They are now kept in a table, one row per (partner, company).
         tools.drop_view_if_exists(self._cr, 'followup_stat_by_partner')
         self._cr.execute("""
-            create view followup_stat_by_partner as (
+            CREATE TABLE IF NOT EXISTS followup_stat_by_partner (
+                id serial PRIMARY KEY,
+                partner_id integer NOT NULL REFERENCES res_partner(id) ON DELETE CASCADE,
+                company_id integer NOT NULL REFERENCES res_company(id) ON DELETE CASCADE,
+                date_move date,
+                date_move_last date,
+                date_followup date,
+                max_followup_id integer,
+                balance numeric,
+                UNIQUE (partner_id, company_id)
+            )""")
+        tools.create_index(
+            self._cr, 'followup_stat_by_partner_company_balance_index',
+            'followup_stat_by_partner', ['company_id', 'balance'])
+        tools.create_index(
+            self._cr, 'followup_stat_by_partner_max_followup_id_index',
+            'followup_stat_by_partner', ['max_followup_id'])
+        self._refresh()
+
+    def _refresh(self, keys=None):
+        """ Rebuild the statistics of the given ``(partner_id, company_id)`` keys,
+        or of all the partners if None. The rows keep their id. """
+        if keys is not None and not keys:
+            return
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id', 'debit', 'credit',
+            'date', 'followup_line_id', 'followup_date',
+        ])
+        key_filter = ''
+        stat_filter = ''
+        params = []
+        if keys is not None:
+            partner_ids = [key[0] for key in keys]
+            company_ids = [key[1] for key in keys]
+            key_filter = """AND (l.partner_id, l.company_id) IN (
+                SELECT * FROM unnest(%(partner_ids)s::integer[], %(company_ids)s::integer[]))"""
+            stat_filter = """AND (s.partner_id, s.company_id) IN (
+                SELECT * FROM unnest(%(partner_ids)s::integer[], %(company_ids)s::integer[]))"""
+            params = {'partner_ids': partner_ids, 'company_ids': company_ids}
+        self._cr.execute("""
+            WITH stat AS (
                 SELECT
-                    l.partner_id * 10000::bigint + l.company_id as id,
                     l.partner_id AS partner_id,
                     min(l.date) AS date_move,
                     max(l.date) AS date_move_last,
@@ -43,8 +87,67 @@ class FollowupStatByPartner(models.Model):
                     a.account_type = 'asset_receivable' AND
                     l.full_reconcile_id is NULL AND
                     l.partner_id IS NOT NULL
-                    GROUP BY
+                    """ + key_filter + """
+                GROUP BY
                     l.partner_id, l.company_id
-            )""")
+            ), deleted AS (
+                DELETE FROM followup_stat_by_partner s
+                 WHERE NOT EXISTS (
+                        SELECT 1 FROM stat
+                         WHERE stat.partner_id = s.partner_id
+                           AND stat.company_id = s.company_id)
+                   """ + stat_filter + """
+            )
+            INSERT INTO followup_stat_by_partner (
+                partner_id, company_id, date_move, date_move_last,
+                date_followup, max_followup_id, balance)
+            SELECT partner_id, company_id, date_move, date_move_last,
+                   date_followup, max_followup_id, balance
+              FROM stat
+            ON CONFLICT (partner_id, company_id) DO UPDATE
+               SET date_move = EXCLUDED.date_move,
+                   date_move_last = EXCLUDED.date_move_last,
+                   date_followup = EXCLUDED.date_followup,
+                   max_followup_id = EXCLUDED.max_followup_id,
+                   balance = EXCLUDED.balance
+        """, params or None)
+        self.invalidate_model()
 
+    @api.model
+    def _schedule_refresh(self, lines):
+        """ Mark the statistics of the partners of the given journal items to be
+        refreshed before the transaction commits, or before they are read again
+        by the follow-up processing. """
+        keys = {
+            (line.partner_id.id, line.company_id.id)
+            for line in lines if line.partner_id and line.company_id
+        }
+        if not keys:
+            return
+        pending = self.env.cr.precommit.data.setdefault(self._refresh_key, set())
+        if not pending:
+            self.env.cr.precommit.add(self.sudo()._refresh_pending)
+        pending.update(keys)
+
+    def _refresh_pending(self):
+        keys = self.env.cr.precommit.data.pop(self._refresh_key, set())
+        if keys:
+            self.sudo()._refresh(keys)
 
+    @api.model
+    def _get_stat_ids(self, keys):
+        """ Ids of the statistics of the given ``(partner_id, company_id)`` keys.
+
+        :return: dictionary {(partner_id, company_id): id}
+        """
+        if not keys:
+            return {}
+        self._refresh_pending()
+        keys = list(keys)
+        self._cr.execute("""
+            SELECT partner_id, company_id, id
+              FROM followup_stat_by_partner
+             WHERE (partner_id, company_id) IN (
+                   SELECT * FROM unnest(%s::integer[], %s::integer[]))
+        """, ([key[0] for key in keys], [key[1] for key in keys]))
+        return {(partner_id, company_id): stat_id for partner_id, company_id, stat_id in self._cr.fetchall()}
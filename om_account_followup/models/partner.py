@@ -1,8 +1,9 @@
-from functools import reduce
+from collections import defaultdict
 from lxml import etree
 from odoo import api, fields, models, _
-from datetime import datetime
+from datetime import timedelta
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
 from odoo.tools.misc import formatLang
 
 
@@ -22,32 +23,62 @@ class ResPartner(models.Model):
             res['arch'] = etree.tostring(doc, encoding="utf-8")
         return res
 
-    def _get_latest(self):
-        company = self.env.user.company_id
+    def _get_followup_aggregates(self):
+        """ Aggregate the unreconciled receivable items of the current company
+        for all the partners of the recordset in a single query.
+
+        :return: dictionary keyed by partner id:
+            {partner_id: {'level_id': ..., 'followup_date': ..., 'amount_due': ...,
+                          'amount_overdue': ..., 'earliest_due_date': ...}}
+        """
+        partner_ids = [partner_id for partner_id in self._origin.ids if partner_id]
+        if not partner_ids:
+            return {}
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id', 'debit', 'credit',
+            'date', 'date_maturity', 'followup_line_id', 'followup_date',
+        ])
+        self.env['account.account'].flush_model(['account_type'])
+        self.env['followup.line'].flush_model(['delay'])
+        self._cr.execute("""
+            SELECT l.partner_id,
+                   (ARRAY_AGG(fl.id ORDER BY fl.delay DESC) FILTER (WHERE fl.id IS NOT NULL))[1],
+                   MAX(l.followup_date),
+                   SUM(l.debit - l.credit),
+                   SUM(l.debit - l.credit) FILTER (WHERE COALESCE(l.date_maturity, l.date) <= %s),
+                   MIN(COALESCE(l.date_maturity, l.date))
+              FROM account_move_line l
+              JOIN account_account a ON a.id = l.account_id
+         LEFT JOIN followup_line fl ON fl.id = l.followup_line_id
+             WHERE l.partner_id = ANY(%s)
+               AND l.company_id = %s
+               AND a.account_type = 'asset_receivable'
+               AND l.full_reconcile_id IS NULL
+          GROUP BY l.partner_id
+        """, (fields.Date.today(), partner_ids, self.env.user.company_id.id))
+        return {
+            partner_id: {
+                'level_id': level_id,
+                'followup_date': followup_date,
+                'amount_due': amount_due or 0.0,
+                'amount_overdue': amount_overdue or 0.0,
+                'earliest_due_date': earliest_due_date,
+            }
+            for partner_id, level_id, followup_date, amount_due, amount_overdue, earliest_due_date
+            in self._cr.fetchall()
+        }
+
+    def _get_followup_values(self):
+        # the latest level and the amounts are computed together, from one query
+        aggregates = self._get_followup_aggregates()
         for partner in self:
-            amls = partner.unreconciled_aml_ids
-            latest_date = False
-            latest_level = False
-            latest_days = False
-            latest_level_without_lit = False
-            latest_days_without_lit = False
-            for aml in amls:
-                aml_followup = aml.followup_line_id
-                if (aml.company_id == company) and aml_followup and \
-                        (not latest_days or latest_days < aml_followup.delay):
-                    latest_days = aml_followup.delay
-                    latest_level = aml_followup.id
-                if (aml.company_id == company) and aml.followup_date and (
-                        not latest_date or latest_date < aml.followup_date):
-                    latest_date = aml.followup_date
-                if (aml.company_id == company) and \
-                        (aml_followup and (not latest_days_without_lit or
-                         latest_days_without_lit < aml_followup.delay)):
-                    latest_days_without_lit = aml_followup.delay
-                    latest_level_without_lit = aml_followup.id
-            partner.latest_followup_date = latest_date
-            partner.latest_followup_level_id = latest_level
-            partner.latest_followup_level_id_without_lit = latest_level_without_lit
+            values = aggregates.get(partner._origin.id, {})
+            partner.latest_followup_date = values.get('followup_date', False)
+            partner.latest_followup_level_id = values.get('level_id', False)
+            partner.latest_followup_level_id_without_lit = values.get('level_id', False)
+            partner.payment_amount_due = values.get('amount_due', 0.0)
+            partner.payment_amount_overdue = values.get('amount_overdue', 0.0)
+            partner.payment_earliest_due_date = values.get('earliest_due_date', False)
 
     def do_partner_manual_action_dermanord(self, followup_line):
         action_text = followup_line.manual_action_note or ''
@@ -103,6 +134,8 @@ class ResPartner(models.Model):
         ctx['followup'] = True
         template = 'om_account_followup.email_template_om_account_followup_default'
         unknown_mails = 0
+        recipients_by_template = defaultdict(list)
+        log_bodies = {}
         for partner in self:
             partners_to_email = [child for child in partner.child_ids if
                                  child.type == 'invoice' and child.email]
@@ -110,21 +143,19 @@ class ResPartner(models.Model):
                 partners_to_email = [partner]
             if partners_to_email:
                 level = partner.latest_followup_level_id_without_lit
-                for partner_to_email in partners_to_email:
-                    if level and level.send_email and \
-                            level.email_template_id and \
-                            level.email_template_id.id:
-                        level.email_template_id.with_context(ctx).send_mail(
-                            partner_to_email.id)
-                    else:
-                        mail_template_id = self.env.ref(template)
-                        mail_template_id.with_context(ctx).send_mail(
-                            partner_to_email.id)
+                if level and level.send_email and \
+                        level.email_template_id and \
+                        level.email_template_id.id:
+                    mail_template = level.email_template_id
+                else:
+                    mail_template = self.env.ref(template)
+                recipients_by_template[mail_template] += [
+                    partner_to_email.id for partner_to_email in partners_to_email]
                 if partner not in partners_to_email:
-                    partner.message_post(body=_(
-                        'Overdue email sent to %s' % ', '.join(
-                            ['%s <%s>' % (partner.name, partner.email) for
-                             partner in partners_to_email])))
+                    log_bodies[partner.id] = _(
+                        'Overdue email sent to %s', ', '.join(
+                            ['%s <%s>' % (partner_to_email.name, partner_to_email.email) for
+                             partner_to_email in partners_to_email]))
             else:
                 unknown_mails = unknown_mails + 1
                 action_text = _("Email not sent because of email address "
@@ -143,59 +174,105 @@ class ResPartner(models.Model):
                 partner.with_context(ctx).write(
                     {'payment_next_action_date': payment_action_date,
                      'payment_next_action': payment_next_action})
+        self.with_context(ctx)._queue_followup_mails(recipients_by_template)
+        if log_bodies:
+            self.browse(list(log_bodies))._message_log_batch(bodies=log_bodies)
         return unknown_mails
 
+    @api.model
+    def _get_followup_mail_batches(self):
+        """ Size of the batches of follow-up emails and minutes between two batches. """
+        params = self.env['ir.config_parameter'].sudo()
+        batch_size = int(params.get_param('om_account_followup.mail_batch_size', 200))
+        batch_interval = int(params.get_param('om_account_followup.mail_batch_interval', 5))
+        return max(batch_size, 1), max(batch_interval, 0)
+
+    @api.model
+    def _queue_followup_mails(self, recipients_by_template):
+        """ Render the follow-up emails in batch and put them in the outgoing queue.
+
+        The emails are not sent while the user waits: every batch is scheduled a few
+        minutes after the previous one, and the mail scheduler is triggered for each.
+
+        :param recipients_by_template: dictionary {mail template: [partner ids]}
+        :return: number of queued emails
+        """
+        recipients = [
+            (mail_template, partner_id)
+            for mail_template, partner_ids in recipients_by_template.items()
+            for partner_id in partner_ids
+        ]
+        if not recipients:
+            return 0
+        batch_size, batch_interval = self._get_followup_mail_batches()
+        now = fields.Datetime.now()
+        scheduled_dates = []
+        for index, batch in enumerate(split_every(batch_size, recipients)):
+            scheduled_date = now + timedelta(minutes=batch_interval * index)
+            partner_ids_by_template = defaultdict(list)
+            for mail_template, partner_id in batch:
+                partner_ids_by_template[mail_template].append(partner_id)
+            for mail_template, partner_ids in partner_ids_by_template.items():
+                mail_template.send_mail_batch(
+                    partner_ids, force_send=False,
+                    email_values={'scheduled_date': scheduled_date})
+            scheduled_dates.append(scheduled_date)
+        mail_cron = self.env.ref('mail.ir_cron_mail_scheduler_action', raise_if_not_found=False)
+        if mail_cron:
+            mail_cron.sudo()._trigger(at=scheduled_dates)
+        return len(recipients)
+
     def get_followup_table_html(self):
+        """ Table of the overdue items of the partner, for the follow-up emails.
+
+        The tables of all the partners rendered together (the prefetched records,
+        e.g. the recipients of a batch of emails) are built at once and kept for
+        the rest of the transaction, per partner, company, date and language.
+        """
         self.ensure_one()
-        partner = self.commercial_partner_id
-        followup_table = ''
-        if partner.unreconciled_aml_ids:
-            company = self.env.user.company_id
-            current_date = fields.Date.today()
-            report = self.env['report.om_account_followup.report_followup']
-            final_res = report._lines_get_with_partner(partner, company.id)
-
-            for currency_dict in final_res:
-                currency = currency_dict.get('line', [
-                    {'currency_id': company.currency_id}])[0]['currency_id']
-                followup_table += '''
-                <table border="2" width=100%%>
-                <tr>
-                    <td>''' + _("Invoice Date") + '''</td>
-                    <td>''' + _("Description") + '''</td>
-                    <td>''' + _("Reference") + '''</td>
-                    <td>''' + _("Due Date") + '''</td>
-                    <td>''' + _("Amount") + " (%s)" % (
-                    currency.symbol) + '''</td>
-                    <td>''' + _("Lit.") + '''</td>
-                </tr>
-                '''
-                total = 0
-                for aml in currency_dict['line']:
-                    total += aml['balance']
-                    strbegin = "<TD>"
-                    strend = "</TD>"
-                    date = aml['date_maturity'] or aml['date']
-                    date = datetime.strptime(date, "%d/%m/%Y").date()
-                    if date <= current_date and aml['balance'] > 0:
-                        strbegin = "<TD><B>"
-                        strend = "</B></TD>"
-                    followup_table += "<TR>" + strbegin + str(aml['date']) + \
-                                      strend + strbegin + aml['name'] + \
-                                      strend + strbegin + \
-                                      (aml['ref'] or '') + strend + \
-                                      strbegin + str(date) + strend + \
-                                      strbegin + str(aml['balance']) + \
-                                      strend + "</TR>"
-
-                total = reduce(lambda x, y: x + y['balance'],
-                               currency_dict['line'], 0.00)
-                total = formatLang(self.env, total, currency_obj=currency)
-                followup_table += '''<tr> </tr>
-                                </table>
-                                <center>''' + _(
-                    "Amount due") + ''' : %s </center>''' % (total)
-        return followup_table
+        cache = self.env.cr.cache.setdefault('om_account_followup.followup_table_html', {})
+        company = self.env.user.company_id
+        key = (self.commercial_partner_id.id, company.id, fields.Date.today(), self.env.lang)
+        if key not in cache:
+            partners = self.browse(self._prefetch_ids).commercial_partner_id | self.commercial_partner_id
+            cache.update(partners._render_followup_tables(company))
+        return cache[key]
+
+    def _render_followup_tables(self, company):
+        """ Render the follow-up tables of the partners of the recordset.
+
+        :return: dictionary {(partner_id, company_id, date, lang): html}
+        """
+        current_date = fields.Date.today()
+        report = self.env['report.om_account_followup.report_followup']
+        lines_by_key = report._lines_get_with_partners({(partner.id, company.id) for partner in self})
+        tables = {}
+        for partner in self:
+            key = (partner.id, company.id, current_date, self.env.lang)
+            currency_lines = lines_by_key.get((partner.id, company.id))
+            if not currency_lines:
+                tables[key] = ''
+                continue
+            tables_values = []
+            for currency_dict in currency_lines:
+                currency = currency_dict['currency']
+                tables_values.append({
+                    'currency': currency,
+                    'rows': [{
+                        'highlight': aml['date_due'] <= current_date and aml['balance'] > 0,
+                        'cells': [
+                            aml['date'], aml['name'], aml['ref'] or '',
+                            aml['date_maturity'] or aml['date'],
+                            formatLang(self.env, aml['balance'], currency_obj=currency),
+                        ],
+                    } for aml in currency_dict['line']],
+                    'amount_due': formatLang(
+                        self.env, sum(aml['balance'] for aml in currency_dict['line']),
+                        currency_obj=currency),
+                })
+            tables[key] = self.env['ir.qweb']._render(
+                'om_account_followup.followup_table', {'tables': tables_values})
+        return tables
 
     def write(self, vals):
         if vals.get("payment_responsible_id", False):
@@ -237,7 +314,8 @@ class ResPartner(models.Model):
         self.message_post(body=_('Printed overdue payments report'))
         self.message_post(body=_('Printed overdue payments report'))
 
-        wizard_partner_ids = [self.id * 10000 + company_id]
+        wizard_partner_ids = list(self.env['followup.stat.by.partner']._get_stat_ids(
+            [(self.id, company_id)]).values())
         followup_ids = self.env['followup.followup'].search(
             [('company_id', '=', company_id)])
         if not followup_ids:
@@ -249,101 +327,110 @@ class ResPartner(models.Model):
         }
         return self.do_partner_print(wizard_partner_ids, data)
 
-    def _get_amounts_and_date(self):
-        company = self.env.user.company_id
-        current_date = fields.Date.today()
-        for partner in self:
-            worst_due_date = False
-            amount_due = amount_overdue = 0.0
-            for aml in partner.unreconciled_aml_ids:
-                if (aml.company_id == company):
-                    date_maturity = aml.date_maturity or aml.date
-                    if not worst_due_date or date_maturity < worst_due_date:
-                        worst_due_date = date_maturity
-                    amount_due += aml.result
-                    if (date_maturity <= current_date):
-                        amount_overdue += aml.result
-            partner.payment_amount_due = amount_due
-            partner.payment_amount_overdue = amount_overdue
-            partner.payment_earliest_due_date = worst_due_date
-
-    def _get_followup_overdue_query(self, args, overdue_only=False):
-        company_id = self.env.user.company_id.id
+    # comparison operators of the follow-up search methods
+    _followup_sql_operators = {
+        '=': '=', '!=': '<>', '<>': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>=',
+    }
+
+    def _get_followup_sql_operator(self, operator):
+        if operator not in self._followup_sql_operators:
+            raise ValidationError(_("Unsupported operator: %s", operator))
+        return self._followup_sql_operators[operator]
+
+    def _get_followup_overdue_query(self, args, overdue_only=False, negate=False):
+        """ Query the partners whose unreconciled receivable items of the current
+        company match all the ``args`` on the sum of their balance.
+
+        The query starts from the receivable items and filters the groups with
+        HAVING: partners without any such item are never returned.
+
+        :param negate: return the partners with items that do not match the args
+        :return: tuple (query, params)
+        """
         having_clauses = []
         having_values = []
-
         for field, operator, value in args:
-            if operator in ['=', '!=', '>', '>=', '<', '<=']:
-                having_clauses.append(f'SUM(bal2) {operator} %s')
-                having_values.append(value)
-            else:
-                raise ValueError(f"Unsupported operator: {operator}")
-
-        having_where_clause = ' AND '.join(having_clauses)
-        overdue_only_str = 'AND date_maturity <= NOW()' if overdue_only else ''
-
-        query = ('''
-            SELECT pid AS partner_id, SUM(bal2) FROM (
-                SELECT 
-                    CASE WHEN bal IS NOT NULL THEN bal ELSE 0.0 END AS bal2, 
-                    p.id as pid 
-                FROM (
-                    SELECT 
-                        (debit - credit) AS bal, 
-                        partner_id 
-                    FROM account_move_line l
-                    LEFT JOIN account_account a ON a.id = l.account_id
-                    WHERE a.account_type = 'asset_receivable'
-                    %s AND full_reconcile_id IS NULL
-                    AND l.company_id = %%s
-                ) AS l
-                RIGHT JOIN res_partner p ON p.id = partner_id 
-            ) AS pl
-            GROUP BY pid HAVING %s
-        ''') % (overdue_only_str, having_where_clause)
-
-        params = [company_id] + having_values
-        return query, params
+            having_clauses.append(
+                'SUM(l.debit - l.credit) %s %%s' % self._get_followup_sql_operator(operator))
+            having_values.append(value or 0.0)
+        having_where_clause = ' AND '.join(having_clauses) or 'TRUE'
+        if negate:
+            having_where_clause = 'NOT (%s)' % having_where_clause
 
-    def _payment_overdue_search(self, operator, operand):
-        args = [('payment_amount_overdue', operator, operand)]
-        query, params = self._get_followup_overdue_query(args, overdue_only=True)
+        params = [self.env.user.company_id.id]
+        overdue_only_str = ''
+        if overdue_only:
+            overdue_only_str = 'AND COALESCE(l.date_maturity, l.date) <= %s'
+            params.append(fields.Date.today())
+        query = """
+            SELECT l.partner_id, SUM(l.debit - l.credit)
+              FROM account_move_line l
+              JOIN account_account a ON a.id = l.account_id
+             WHERE l.company_id = %s
+               AND l.full_reconcile_id IS NULL
+               AND l.partner_id IS NOT NULL
+               AND a.account_type = 'asset_receivable'
+               """ + overdue_only_str + """
+          GROUP BY l.partner_id
+            HAVING """ + having_where_clause
+        return query, params + having_values
+
+    def _payment_amount_search(self, field_name, operator, operand, overdue_only=False):
+        args = [(field_name, operator, operand)]
+        sql_operator = self._get_followup_sql_operator(operator)
+        # partners without receivable items have an amount of 0: when 0 matches,
+        # exclude the partners with items that do not match instead
+        zero_matches = {
+            '=': lambda value: value == 0,
+            '<>': lambda value: value != 0,
+            '<': lambda value: 0 < value,
+            '<=': lambda value: 0 <= value,
+            '>': lambda value: 0 > value,
+            '>=': lambda value: 0 >= value,
+        }[sql_operator](operand or 0.0)
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id', 'debit', 'credit',
+            'date', 'date_maturity',
+        ])
+        query, params = self._get_followup_overdue_query(
+            args, overdue_only=overdue_only, negate=zero_matches)
         self._cr.execute(query, params)
-        res = self._cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        partner_ids = [row[0] for row in self._cr.fetchall()]
+        if zero_matches:
+            return [('id', 'not in', partner_ids)]
+        return [('id', 'in', partner_ids)]
+
+    def _payment_overdue_search(self, operator, operand):
+        return self._payment_amount_search('payment_amount_overdue', operator, operand, overdue_only=True)
 
     def _payment_earliest_date_search(self, operator, operand):
-        args = [('payment_earliest_due_date', operator, operand)]
-        company_id = self.env.user.company_id.id
-        having_where_clause = ' AND '.join(
-            map(lambda x: "(MIN(l.date_maturity) %s '%%s')" % (x[1]), args))
-        having_values = [x[2] for x in args]
-        having_where_clause = having_where_clause % (having_values[0])
-        query = """SELECT partner_id FROM account_move_line l
-                LEFT JOIN account_account a ON a.id = l.account_id
-                WHERE a.account_type = 'asset_receivable' 
-                AND l.company_id = %s 
-                AND l.full_reconcile_id IS NULL 
-                AND partner_id IS NOT NULL GROUP BY partner_id"""
-        query = query % company_id
-        if having_where_clause:
-            query += ' HAVING %s ' % (having_where_clause)
-        self._cr.execute(query)
-        res = self._cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id', 'date', 'date_maturity',
+        ])
+        query = """
+            SELECT l.partner_id
+              FROM account_move_line l
+              JOIN account_account a ON a.id = l.account_id
+             WHERE l.company_id = %s
+               AND l.full_reconcile_id IS NULL
+               AND l.partner_id IS NOT NULL
+               AND a.account_type = 'asset_receivable'
+          GROUP BY l.partner_id"""
+        params = [self.env.user.company_id.id]
+        if not operand:
+            # partners without receivable items have no worst due date
+            if operator not in ('=', '!='):
+                raise ValidationError(_("Unsupported operator: %s", operator))
+            self._cr.execute(query, params)
+            partner_ids = [row[0] for row in self._cr.fetchall()]
+            return [('id', 'not in' if operator == '=' else 'in', partner_ids)]
+        query += """
+            HAVING MIN(COALESCE(l.date_maturity, l.date)) %s %%s""" % self._get_followup_sql_operator(operator)
+        self._cr.execute(query, params + [operand])
+        return [('id', 'in', [row[0] for row in self._cr.fetchall()])]
 
     def _payment_due_search(self, operator, operand):
-        args = [('payment_amount_due', operator, operand)]
-        query, params = self._get_followup_overdue_query(args, overdue_only=False)
-        self._cr.execute(query, params)
-        res = self._cr.fetchall()
-        if not res:
-            return [('id', '=', '0')]
-        return [('id', 'in', [x[0] for x in res])]
+        return self._payment_amount_search('payment_amount_due', operator, operand)
 
     def _get_partners(self):
         partners = set()
@@ -377,11 +464,11 @@ class ResPartner(models.Model):
         domain=[('full_reconcile_id', '=', False), ('account_id.account_type', '=', 'asset_receivable')]
     )
     latest_followup_date = fields.Date(
-        compute='_get_latest', string="Latest Follow-up Date", compute_sudo=True,
+        compute='_get_followup_values', string="Latest Follow-up Date", compute_sudo=True,
         help="Latest date that the follow-up level of the partner was changed"
     )
     latest_followup_level_id = fields.Many2one(
-        'followup.line', compute='_get_latest', compute_sudo=True,
+        'followup.line', compute='_get_followup_values', compute_sudo=True,
         string="Latest Follow-up Level", help="The maximum follow-up level"
     )
 
@@ -390,19 +477,19 @@ class ResPartner(models.Model):
         help="Gives the sequence order when displaying a list of follow-up lines.", default=0
     )
     latest_followup_level_id_without_lit = fields.Many2one(
-        'followup.line', compute='_get_latest', compute_sudo=True,
+        'followup.line', compute='_get_followup_values', compute_sudo=True,
         string="Latest Follow-up Level without litigation",
         help="The maximum follow-up level without taking into "
              "account the account move lines with litigation")
     payment_amount_due = fields.Float(
-        compute='_get_amounts_and_date',
+        compute='_get_followup_values', compute_sudo=True,
         string="Amount Due", search='_payment_due_search'
     )
     payment_amount_overdue = fields.Float(
-        compute='_get_amounts_and_date',
+        compute='_get_followup_values', compute_sudo=True,
         string="Amount Overdue", search='_payment_overdue_search'
     )
     payment_earliest_due_date = fields.Date(
-        compute='_get_amounts_and_date', string="Worst Due Date",
+        compute='_get_followup_values', compute_sudo=True, string="Worst Due Date",
         search='_payment_earliest_date_search'
     )
@@ -14,15 +14,24 @@ class ReportFollowup(models.AbstractModel):
         model = self.env['followup.sending.results']
         ids = self.env.context.get('active_ids') or False
         docs = model.browse(ids)
+        form = data and data['form'] or {}
+        # the lines and texts of all the partners are loaded at once, the
+        # template only reads them back
+        stat_lines = self.env['followup.stat.by.partner'].browse(form.get('partner_ids') or [])
+        lines_by_key = self._lines_get_with_partners(
+            {(stat_line.partner_id.id, stat_line.company_id.id) for stat_line in stat_lines})
+        texts = self._get_texts(stat_lines, form['followup_id']) if stat_lines and form.get('followup_id') else {}
         return {
             'docs': docs,
             'doc_ids': docids,
             'doc_model': model,
             'time': time,
             'ids_to_objects': self._ids_to_objects,
-            'getLines': self._lines_get,
-            'get_text': self._get_text,
-            'data': data and data['form'] or {}}
+            'getLines': lambda stat_line: lines_by_key.get(
+                (stat_line.partner_id.id, stat_line.company_id.id), []),
+            'get_text': lambda stat_line, followup_id, context=None: texts[stat_line.id]
+            if stat_line.id in texts else self._get_text(stat_line, followup_id),
+            'data': form}
 
     def _ids_to_objects(self, ids):
         all_lines = []
@@ -36,37 +45,75 @@ class ReportFollowup(models.AbstractModel):
                                             stat_by_partner_line.company_id.id)
 
     def _lines_get_with_partner(self, partner, company_id):
-        moveline_obj = self.env['account.move.line']
-        moveline_ids = moveline_obj.search(
-            [('partner_id', '=', partner.id),
+        return self._lines_get_with_partners({(partner.id, company_id)}).get((partner.id, company_id), [])
+
+    def _lines_get_with_partners(self, keys):
+        """ Overdue items of many partners, loaded with a single search.
+
+        :param keys: set of ``(partner_id, company_id)``
+        :return: dictionary {(partner_id, company_id): [{'total': ..., 'line': [...], 'currency': ...}]}
+        """
+        if not keys:
+            return {}
+        moveline_ids = self.env['account.move.line'].search(
+            [('partner_id', 'in', list({key[0] for key in keys})),
              ('account_id.account_type', '=', 'asset_receivable'),
              ('full_reconcile_id', '=', False),
-             ('company_id', '=', company_id),
+             ('company_id', 'in', list({key[1] for key in keys})),
              '|', ('date_maturity', '=', False),
              ('date_maturity', '<=', fields.Date.today())])
-        lines_per_currency = defaultdict(list)
-        total = 0
+        moveline_ids.fetch(['move_id', 'ref', 'date', 'date_maturity', 'debit', 'credit',
+                            'amount_currency', 'currency_id', 'company_id', 'partner_id'])
+        moveline_ids.move_id.fetch(['name'])
+
+        formatted_dates = {}
+
+        def _format_date(date):
+            if date not in formatted_dates:
+                formatted_dates[date] = format_date(self.env, date)
+            return formatted_dates[date]
+
+        lines_per_key = defaultdict(lambda: defaultdict(list))
+        totals = defaultdict(float)
         for line in moveline_ids:
-            currency = line.currency_id or line.company_id.currency_id
+            key = (line.partner_id.id, line.company_id.id)
+            if key not in keys:
+                continue
+            company_currency = line.company_id.currency_id
+            currency = line.currency_id or company_currency
             balance = line.debit - line.credit
-            if currency != line.company_id.currency_id:
+            if currency != company_currency:
                 balance = line.amount_currency
             line_data = {
                 'name': line.move_id.name,
                 'ref': line.ref,
-                'date': format_date(self.env, line.date),
-                'date_maturity': format_date(self.env, line.date_maturity),
+                'date': _format_date(line.date),
+                'date_maturity': _format_date(line.date_maturity),
+                'date_due': line.date_maturity or line.date,
                 'balance': balance,
                 'currency_id': currency,
             }
-            total = total + line_data['balance']
-            lines_per_currency[currency].append(line_data)
+            totals[key] += balance
+            lines_per_key[key][currency].append(line_data)
 
-        return [{'total': total, 'line': lines, 'currency': currency} for
-                currency, lines in
-                lines_per_currency.items()]
+        return {
+            key: [{'total': totals[key], 'line': lines, 'currency': currency} for
+                  currency, lines in
+                  lines_per_currency.items()]
+            for key, lines_per_currency in lines_per_key.items()
+        }
 
     def _get_text(self, stat_line, followup_id, context=None):
+        return self._get_texts(stat_line, followup_id)[stat_line.id]
+
+    def _get_texts(self, stat_lines, followup_id):
+        """ Printed messages of many follow-up statistics lines.
+
+        The highest follow-up level reached by every partner is read with a single
+        grouped query, and the date format is resolved once per language.
+
+        :return: dictionary {stat line id: text}
+        """
         fp_obj = self.env['followup.followup']
         fp_line = fp_obj.browse(followup_id).followup_line
         if not fp_line:
@@ -74,37 +121,43 @@ class ReportFollowup(models.AbstractModel):
                 _("The followup plan defined for the current company does not "
                   "have any followup action."))
         default_text = ''
-        li_delay = []
         for line in fp_line:
             if not default_text and line.description:
                 default_text = line.description
-            li_delay.append(line.delay)
-        li_delay.sort(reverse=True)
-        partner_line_ids = self.env['account.move.line'].search(
-            [('partner_id', '=', stat_line.partner_id.id),
-             ('full_reconcile_id', '=', False),
-             ('company_id', '=', stat_line.company_id.id),
-             ('debit', '!=', False),
-             ('account_id.account_type', '=', 'asset_receivable'),
-             ('followup_line_id', '!=', False)])
-
-        partner_max_delay = 0
-        partner_max_text = ''
-        for i in partner_line_ids:
-            if i.followup_line_id.delay > partner_max_delay and \
-                    i.followup_line_id.description:
-                partner_max_delay = i.followup_line_id.delay
-                partner_max_text = i.followup_line_id.description
-        text = partner_max_delay and partner_max_text or default_text
-        if text:
-            lang_obj = self.env['res.lang']
-            lang_ids = lang_obj.search(
-                [('code', '=', stat_line.partner_id.lang)], limit=1)
-            date_format = lang_ids and lang_ids.date_format or '%Y-%m-%d'
-            text = text % {
-                'partner_name': stat_line.partner_id.name,
-                'date': time.strftime(date_format),
-                'company_name': stat_line.company_id.name,
-                'user_signature': self.env.user.signature or '',
-            }
-        return text
+
+        partner_levels = defaultdict(lambda: self.env['followup.line'])
+        for partner, company, followup_line in self.env['account.move.line']._read_group(
+                [('partner_id', 'in', stat_lines.partner_id.ids),
+                 ('full_reconcile_id', '=', False),
+                 ('company_id', 'in', stat_lines.company_id.ids),
+                 ('debit', '!=', False),
+                 ('account_id.account_type', '=', 'asset_receivable'),
+                 ('followup_line_id', '!=', False)],
+                ['partner_id', 'company_id', 'followup_line_id']):
+            partner_levels[(partner.id, company.id)] |= followup_line
+
+        date_formats = {
+            lang.code: lang.date_format
+            for lang in self.env['res.lang'].with_context(active_test=False).search(
+                [('code', 'in', list(set(stat_lines.partner_id.mapped('lang'))))])
+        }
+        texts = {}
+        for stat_line in stat_lines:
+            partner_max_delay = 0
+            partner_max_text = ''
+            for followup_line in partner_levels[(stat_line.partner_id.id, stat_line.company_id.id)]:
+                if followup_line.delay > partner_max_delay and \
+                        followup_line.description:
+                    partner_max_delay = followup_line.delay
+                    partner_max_text = followup_line.description
+            text = partner_max_delay and partner_max_text or default_text
+            if text:
+                date_format = date_formats.get(stat_line.partner_id.lang) or '%Y-%m-%d'
+                text = text % {
+                    'partner_name': stat_line.partner_id.name,
+                    'date': time.strftime(date_format),
+                    'company_name': stat_line.company_id.name,
+                    'user_signature': self.env.user.signature or '',
+                }
+            texts[stat_line.id] = text
+        return texts
@@ -1,3 +1,4 @@
 from . import followup_print
 from . import followup_results
 
+from . import followup_forecast
@@ -0,0 +1,122 @@
+import datetime
+from collections import defaultdict
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+
+class FollowupForecast(models.TransientModel):
+    _name = 'followup.forecast'
+    _description = 'Follow-up Forecast'
+
+    def _get_followup(self):
+        company_id = self.env.user.company_id.id
+        return self.env['followup.followup'].search(
+            [('company_id', '=', company_id)], limit=1) or False
+
+    followup_id = fields.Many2one('followup.followup', 'Follow-Up',
+                                  required=True, default=_get_followup)
+    company_id = fields.Many2one('res.company', readonly=True,
+                                 related='followup_id.company_id')
+    date_from = fields.Date('From', required=True,
+                            default=fields.Date.context_today)
+    date_to = fields.Date(
+        'Until', required=True,
+        default=lambda self: fields.Date.context_today(self) + datetime.timedelta(days=30))
+    line_ids = fields.One2many('followup.forecast.line', 'forecast_id',
+                               string='Forecast')
+
+    def _get_level_changes(self):
+        """ Dates at which the open receivable items reach the next levels of
+        the follow-up, in one pass over the items.
+
+        An item moves up one level each time the follow-up is processed, once
+        its due date is older than the delay of the next level. The follow-up
+        is assumed to be processed every day from ``date_from``.
+
+        :return: dictionary {(partner_id, level_id, date): [amount, item count]}
+        """
+        self.ensure_one()
+        levels = self.followup_id.followup_line.sorted('delay')
+        next_levels = {False: levels}
+        for index, level in enumerate(levels):
+            next_levels[level.id] = levels[index + 1:]
+
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id',
+            'debit', 'amount_residual', 'date', 'date_maturity', 'followup_line_id',
+        ])
+        self._cr.execute(
+            '''SELECT
+                    l.partner_id,
+                    l.followup_line_id,
+                    l.date_maturity,
+                    l.date,
+                    l.amount_residual
+                FROM account_move_line AS l
+                LEFT JOIN account_account AS a
+                ON (l.account_id=a.id)
+                WHERE (l.full_reconcile_id IS NULL)
+                AND a.account_type = 'asset_receivable'
+                AND (l.partner_id is NOT NULL)
+                AND (l.debit > 0)
+                AND (l.company_id = %s)''', (self.company_id.id,))
+
+        one_day = datetime.timedelta(days=1)
+        changes = defaultdict(lambda: [0.0, 0])
+        for partner_id, followup_line_id, date_maturity, date, amount in \
+                self._cr.fetchall():
+            due_date = date_maturity or date
+            if not due_date or (followup_line_id or False) not in next_levels:
+                continue
+            reached = self.date_from - one_day
+            for level in next_levels[followup_line_id or False]:
+                reached = max(due_date + datetime.timedelta(days=level.delay),
+                              reached + one_day)
+                if reached > self.date_to:
+                    break
+                change = changes[(partner_id, level.id, reached)]
+                change[0] += amount
+                change[1] += 1
+        return changes
+
+    def action_forecast(self):
+        self.ensure_one()
+        if self.date_to < self.date_from:
+            raise UserError(_('The end of the forecast must be after its start.'))
+        changes = self._get_level_changes()
+
+        self.line_ids.unlink()
+        self.env['followup.forecast.line'].create([{
+            'forecast_id': self.id,
+            'partner_id': partner_id,
+            'followup_line_id': level_id,
+            'date': date,
+            'amount': amount,
+            'line_count': line_count,
+        } for (partner_id, level_id, date), (amount, line_count) in changes.items()])
+
+        return {
+            'name': _('Upcoming Follow-up Levels'),
+            'view_mode': 'calendar,pivot,list',
+            'res_model': 'followup.forecast.line',
+            'type': 'ir.actions.act_window',
+            'domain': [('forecast_id', '=', self.id)],
+            'context': {'initial_date': fields.Date.to_string(self.date_from)},
+        }
+
+
+class FollowupForecastLine(models.TransientModel):
+    _name = 'followup.forecast.line'
+    _description = 'Follow-up Forecast Line'
+    _rec_name = 'partner_id'
+    _order = 'date, partner_id, followup_line_id'
+
+    forecast_id = fields.Many2one('followup.forecast', required=True,
+                                  ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', 'Partner', readonly=True)
+    followup_line_id = fields.Many2one('followup.line', 'Follow-up Level',
+                                       readonly=True)
+    date = fields.Date('Level Reached On', readonly=True)
+    amount = fields.Float('Amount Due', readonly=True)
+    line_count = fields.Integer('# Items', readonly=True)
@@ -1,5 +1,6 @@
 import datetime
 import time
+from collections import defaultdict
 from odoo import api, fields, models, _
 from markupsafe import Markup
 
@@ -51,6 +52,9 @@ class FollowupPrint(models.TransientModel):
         nbunknownmails = 0
         nbprints = 0
         resulttext = " "
+        partners_to_mail = partner_obj
+        # the follow-up levels were just updated
+        self.env['followup.stat.by.partner']._refresh_pending()
         for partner in self.env['followup.stat.by.partner'].browse(
                 partner_ids):
             if partner.max_followup_id.manual_action:
@@ -63,7 +67,7 @@ class FollowupPrint(models.TransientModel):
                 else:
                     manuals[key] = manuals[key] + 1
             if partner.max_followup_id.send_email:
-                nbunknownmails += partner.partner_id.do_partner_mail()
+                partners_to_mail |= partner.partner_id
                 nbmails += 1
             if partner.max_followup_id.send_letter:
                 partner_ids_to_print.append(partner.id)
@@ -74,13 +78,21 @@ class FollowupPrint(models.TransientModel):
                                                followup_without_lit.name,
                                                _(" will be sent"))
                 partner.partner_id.message_post(body=message)
+        # the emails of all the partners are rendered and queued at once
+        nbunknownmails = partners_to_mail.do_partner_mail()
         if nbunknownmails == 0:
-            resulttext += str(nbmails) + _(" email(s) sent")
+            resulttext += str(nbmails) + _(" email(s) queued")
         else:
             resulttext += str(nbmails) + _(
-                " email(s) should have been sent, but ") + str(
+                " email(s) should have been queued, but ") + str(
                 nbunknownmails) + _(
                 " had unknown email address(es)") + "\n <BR/> "
+        if nbmails > nbunknownmails:
+            batch_size, batch_interval = partner_obj._get_followup_mail_batches()
+            resulttext += "<BR/>" + _(
+                "The emails are sent in the background, by batches of "
+                "%(batch_size)s every %(batch_interval)s minute(s).",
+                batch_size=batch_size, batch_interval=batch_interval) + " \n "
         resulttext += "<BR/>" + str(nbprints) + _(
             " letter(s) in report") + " \n <BR/>" + str(nbmanuals) + _(
             " manual action(s) assigned:")
@@ -100,25 +112,52 @@ class FollowupPrint(models.TransientModel):
         return result
 
     def do_update_followup_level(self, to_update, partner_list, date):
-        for id in to_update.keys():
-            if to_update[id]['partner_id'] in partner_list:
-                self.env['account.move.line'].browse([int(id)]).write(
-                    {'followup_line_id': to_update[id]['level'],
-                     'followup_date': date})
+        # one write per follow-up level instead of one per journal item
+        partner_list = set(partner_list)
+        line_ids_by_level = defaultdict(list)
+        for line_id, values in to_update.items():
+            if values['partner_id'] in partner_list:
+                line_ids_by_level[values['level']].append(int(line_id))
+        for level_id, line_ids in line_ids_by_level.items():
+            self.env['account.move.line'].browse(line_ids).write(
+                {'followup_line_id': level_id, 'followup_date': date})
 
     def clear_manual_actions(self, partner_list):
         partner_list_ids = [partner.partner_id.id for partner in self.env[
             'followup.stat.by.partner'].browse(partner_list)]
-        ids = self.env['res.partner'].search(
-            ['&', ('id', 'not in', partner_list_ids), '|',
+        # the partners with a pending action and no open receivable left in the
+        # company, found at once instead of reading the open items of every partner;
+        # the partners are scoped by the company and the record rules like a search
+        partner_obj = self.env['res.partner']
+        company_id = self.company_id.id
+        partner_obj.flush_model([
+            'active', 'company_id', 'payment_responsible_id',
+            'payment_next_action_date'])
+        self.env['account.move.line'].flush_model([
+            'partner_id', 'account_id', 'company_id', 'full_reconcile_id'])
+        query = partner_obj._where_calc(
+            ['&', '&', ('id', 'not in', partner_list_ids),
+             ('company_id', 'in', [False, company_id]), '|',
              ('payment_responsible_id', '!=', False),
              ('payment_next_action_date', '!=', False)])
-
-        partners_to_clear = []
-        for part in ids:
-            if not part.unreconciled_aml_ids:
-                partners_to_clear.append(part.id)
-                part.action_done()
+        partner_obj._apply_ir_rules(query, 'read')
+        from_string, from_params = query.from_clause
+        where_string, where_params = query.where_clause
+        self._cr.execute(
+            'SELECT res_partner.id FROM ' + from_string +
+            ' WHERE ' + where_string + '''
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM account_move_line AS l
+                    JOIN account_account AS a ON (l.account_id=a.id)
+                    WHERE l.partner_id = res_partner.id
+                    AND l.company_id = %s
+                    AND l.full_reconcile_id IS NULL
+                    AND a.account_type = 'asset_receivable')''',
+            from_params + where_params + [company_id])
+        partners_to_clear = self.env['res.partner'].browse(
+            [row[0] for row in self._cr.fetchall()])
+        partners_to_clear.action_done()
         return len(partners_to_clear)
 
     def do_process(self):
@@ -178,27 +217,28 @@ class FollowupPrint(models.TransientModel):
                 AND (l.partner_id is NOT NULL)
                 AND (l.debit > 0)
                 AND (l.company_id = %s)
-                ORDER BY l.date''' % (company_id))
+                ORDER BY l.date''', (company_id,))
         move_lines = self._cr.fetchall()
         old = None
         fups = {}
         fup_id = 'followup_id' in context and context[
             'followup_id'] or data.followup_id.id
         date = 'date' in context and context['date'] or data.date
-        date = fields.Date.to_string(date)
-        current_date = datetime.date(*time.strptime(date, '%Y-%m-%d')[:3])
+        current_date = fields.Date.to_date(date)
         self._cr.execute(
             '''SELECT *
             FROM followup_line
             WHERE followup_id=%s
-            ORDER BY delay''' % (fup_id,))
+            ORDER BY delay''', (fup_id,))
 
         for result in self._cr.dictfetchall():
             delay = datetime.timedelta(days=result['delay'])
             fups[old] = (current_date - delay, result['id'])
             old = result['id']
 
+        # the list keeps the order of the items, the set makes the lookups constant time
         partner_list = []
+        partner_set = set()
         to_update = {}
 
         for partner_id, followup_line_id, date_maturity, date, id in \
@@ -207,19 +247,19 @@ class FollowupPrint(models.TransientModel):
                 continue
             if followup_line_id not in fups:
                 continue
-            stat_line_id = partner_id * 10000 + company_id
-            if date_maturity:
-                date_maturity = fields.Date.to_string(date_maturity)
-                if date_maturity <= fups[followup_line_id][0].strftime(
-                        '%Y-%m-%d'):
-                    if stat_line_id not in partner_list:
-                        partner_list.append(stat_line_id)
-                    to_update[str(id)] = {'level': fups[followup_line_id][1],
-                                          'partner_id': stat_line_id}
-            elif date and date <= fups[followup_line_id][0].strftime(
-                    '%Y-%m-%d'):
-                if stat_line_id not in partner_list:
-                    partner_list.append(stat_line_id)
+            due_date = date_maturity or date
+            if due_date and due_date <= fups[followup_line_id][0]:
+                if partner_id not in partner_set:
+                    partner_set.add(partner_id)
+                    partner_list.append(partner_id)
                 to_update[str(id)] = {'level': fups[followup_line_id][1],
-                                      'partner_id': stat_line_id}
+                                      'partner_id': partner_id}
+
+        # map the partners to their line of the follow-up statistics
+        stat_ids = self.env['followup.stat.by.partner']._get_stat_ids(
+            [(partner_id, company_id) for partner_id in partner_list])
+        partner_list = [stat_ids[(partner_id, company_id)] for partner_id in partner_list
+                        if (partner_id, company_id) in stat_ids]
+        for values in to_update.values():
+            values['partner_id'] = stat_ids.get((values['partner_id'], company_id))
         return {'partner_ids': partner_list, 'to_update': to_update}
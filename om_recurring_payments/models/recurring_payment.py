@@ -1,7 +1,13 @@
+import logging
+import threading
 from datetime import date
 from dateutil.relativedelta import relativedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+from psycopg2.errors import SerializationFailure
+
+_logger = logging.getLogger(__name__)
 
 
 class RecurringPayment(models.Model):
@@ -35,68 +41,90 @@ class RecurringPayment(models.Model):
     description = fields.Text('Description')
     line_ids = fields.One2many('recurring.payment.line', 'recurring_payment_id', string='Recurring Lines')
 
-    def compute_next_date(self, date):
+    def _get_period_delta(self, count=1):
         period = self.recurring_period
-        interval = self.recurring_interval
+        interval = self.recurring_interval * count
         if period == 'days':
-            date += relativedelta(days=interval)
+            return relativedelta(days=interval)
         elif period == 'weeks':
-            date += relativedelta(weeks=interval)
+            return relativedelta(weeks=interval)
         elif period == 'months':
-            date += relativedelta(months=interval)
-        else:
-            date += relativedelta(years=interval)
-        return date
+            return relativedelta(months=interval)
+        return relativedelta(years=interval)
 
-    def action_create_lines(self, date):
-        ids = self.env['recurring.payment.line']
-        vals = {
+    def compute_next_date(self, date):
+        return date + self._get_period_delta()
+
+    def _get_schedule_dates(self):
+        """ Dates of the occurrences between the start date and the end date.
+
+        Every occurrence is offset from the start date, so that a payment due
+        at the end of the month keeps its day instead of drifting after February.
+        """
+        self.ensure_one()
+        if self.recurring_interval <= 0:
+            raise ValidationError(_('The recurring interval must be a positive number.'))
+        dates = []
+        date = self.date_begin
+        while date < self.date_end:
+            dates.append(date)
+            date = self.date_begin + self._get_period_delta(len(dates))
+        return dates
+
+    def _prepare_line_vals(self, date):
+        self.ensure_one()
+        return {
             'partner_id': self.partner_id.id,
             'amount': self.amount,
             'date': date,
             'recurring_payment_id': self.id,
             'journal_id': self.journal_id.id,
             'currency_id': self.currency_id.id,
+            'company_id': self.company_id.id,
             'state': 'draft'
         }
-        ids.create(vals)
+
+    def action_create_lines(self, date):
+        return self.env['recurring.payment.line'].create([rec._prepare_line_vals(date) for rec in self])
 
     def action_done(self):
-        date_begin = self.date_begin
-        while date_begin < self.date_end:
-            date = date_begin
-            self.action_create_lines(date)
-            date_begin = self.compute_next_date(date)
-        self.state = 'done'
+        # the lines of all the recurring payments are created at once
+        self.env['recurring.payment.line'].create([
+            rec._prepare_line_vals(date)
+            for rec in self
+            for date in rec._get_schedule_dates()
+        ])
+        self.write({'state': 'done'})
 
     def action_draft(self):
         if self.line_ids.filtered(lambda t: t.state == 'done'):
             raise ValidationError(_('You cannot Set to Draft as one of the line is already in done state'))
         else:
-            for line in self.line_ids:
-                line.unlink()
-            self.state = 'draft'
+            self.line_ids.unlink()
+            self.write({'state': 'draft'})
 
     def action_generate_payment(self):
-        line_ids = self.env['recurring.payment.line'].search([('date', '<=', date.today()),
-                                                                       ('state', '!=', 'done')])
-        for line in line_ids:
-            line.action_create_payment()
+        return self.env['recurring.payment.line']._generate_due_payments()
+
+    @api.model
+    def _cron_generate_payments(self):
+        self.env['recurring.payment.line']._generate_due_payments(auto_commit=True)
 
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
             if 'company_id' in vals:
-                vals['name'] = self.env['ir.sequence'].with_context(force_company=vals['company_id']).next_by_code(
+                vals['name'] = self.env['ir.sequence'].with_company(vals['company_id']).next_by_code(
                     'recurring.payment') or _('New')
             else:
                 vals['name'] = self.env['ir.sequence'].next_by_code('recurring.payment') or _('New')
-        return super(RecurringPayment, self).create(vals)
+        return super(RecurringPayment, self).create(vals_list)
 
     @api.constrains('amount')
     def _check_amount(self):
-        if self.amount <= 0:
-            raise ValidationError(_('Amount Must Be Non-Zero Positive Number'))
+        for rec in self:
+            if rec.amount <= 0:
+                raise ValidationError(_('Amount Must Be Non-Zero Positive Number'))
 
     def unlink(self):
         for rec in self:
@@ -120,8 +148,14 @@ class RecurringPaymentLine(models.Model):
     state = fields.Selection(selection=[('draft', 'Draft'),
                                         ('done', 'Done')], default='draft', string='Status')
 
-    def action_create_payment(self):
-        vals = {
+    @api.model
+    def _get_payment_batch_size(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'om_recurring_payments.payment_batch_size', 200))
+
+    def _prepare_payment_vals(self):
+        self.ensure_one()
+        return {
             'payment_type': self.recurring_payment_id.payment_type,
             'amount': self.amount,
             'currency_id': self.currency_id.id,
@@ -131,9 +165,96 @@ class RecurringPaymentLine(models.Model):
             'memo': self.recurring_payment_id.name,
             'partner_id': self.partner_id.id,
         }
-        payment = self.env['account.payment'].create(vals)
-        if payment:
-            if self.recurring_payment_id.journal_state == 'posted':
-                payment.action_post()
-            self.write({'state': 'done', 'payment_id': payment.id})
 
+    def _lock_for_payment(self):
+        """ Lock the lines still waiting for their payment, skipping the ones another
+        transaction is working on, so that a payment is never generated twice. """
+        if not self:
+            return self
+        self.flush_model(['state', 'payment_id'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM recurring_payment_line
+             WHERE id IN %s
+               AND state != 'done'
+               AND payment_id IS NULL
+               FOR UPDATE SKIP LOCKED
+        """, (tuple(self.ids),))
+        locked_ids = {row[0] for row in self.env.cr.fetchall()}
+        self.invalidate_recordset(['state', 'payment_id'])
+        return self.filtered(lambda line: line.id in locked_ids)
+
+    def _create_payments(self):
+        """ Create the payments of the lines at once, and post the ones of the recurring
+        payments generating posted entries with a single call. """
+        lines = self._lock_for_payment()
+        if not lines:
+            return self.env['account.payment']
+        payments = self.env['account.payment'].create([line._prepare_payment_vals() for line in lines])
+        to_post = self.env['account.payment']
+        for line, payment in zip(lines, payments):
+            line.payment_id = payment
+            if line.recurring_payment_id.journal_state == 'posted':
+                to_post |= payment
+        lines.write({'state': 'done'})
+        if to_post:
+            to_post.action_post()
+        return payments
+
+    def action_create_payment(self):
+        self._create_payments()
+
+    @api.model
+    def _generate_due_payments(self, date=None, batch_size=None, auto_commit=False):
+        """ Create the payments of the lines due at ``date``, by journal and by chunks
+        of ``batch_size``.
+
+        With ``auto_commit``, every chunk is locked in a new transaction and committed
+        on its own. A chunk another worker committed in the meantime is left to it. A
+        chunk failing otherwise is rolled back and its lines are retried one by one,
+        so that a failing line is logged and skipped without holding back the others;
+        it stays due for the next run.
+        """
+        # never commit during the tests
+        auto_commit = auto_commit and not getattr(threading.current_thread(), 'testing', False)
+        date = date or fields.Date.context_today(self)
+        batch_size = batch_size or self._get_payment_batch_size()
+        lines = self.search([
+            ('date', '<=', date), ('state', '!=', 'done'), ('payment_id', '=', False),
+        ], order='journal_id, date, id')
+        payments = self.env['account.payment']
+        for journal, journal_lines in lines.grouped('journal_id').items():
+            journal_lines = journal_lines.with_company(journal.company_id)
+            for batch in split_every(batch_size, journal_lines.ids, journal_lines.browse):
+                if not auto_commit:
+                    payments |= batch._create_payments()
+                    continue
+                # lock the lines in a snapshot taken after the lines of the other workers
+                # were committed, so that they are skipped instead of conflicting
+                self.env.cr.commit()
+                try:
+                    with self.env.cr.savepoint():
+                        batch_payments = batch._create_payments()
+                except SerializationFailure:
+                    _logger.info("Recurring lines %s were updated by another transaction, skipping them",
+                                 batch.ids)
+                    continue
+                except Exception:
+                    _logger.warning("Failed to generate the payments of recurring lines %s, retrying them one by one",
+                                    batch.ids, exc_info=True)
+                    batch_payments = batch._create_payments_one_by_one()
+                self.env.cr.commit()
+                payments |= batch_payments
+        return payments
+
+    def _create_payments_one_by_one(self):
+        payments = self.env['account.payment']
+        for line in self:
+            try:
+                with self.env.cr.savepoint():
+                    payments |= line._create_payments()
+            except SerializationFailure:
+                _logger.info("Recurring line %s was updated by another transaction, skipping it", line.id)
+            except Exception:
+                _logger.exception("Failed to generate the payment of recurring line %s", line.id)
+        return payments